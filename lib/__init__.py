@@ -1,2 +1,37 @@
+import importlib
+
 from _cleaner import *
-from dream_cluster import DreamCluster
\ No newline at end of file
+from _clean_cache import *
+from _normalize import *
+
+# Everything else pulls in pyarrow, scipy, onnxruntime, hdbscan / umap, ...
+# so it is imported on first attribute access instead of with the package.
+_LAZY = {
+    "_ingest": ["DROP_FIELDS", "POST_SCHEMA", "normalize_mongo_record", "coerce_record", "iter_dump_records", "ingest_dump"],
+    "_sync": ["sync_posts"],
+    "_dedup": ["deduplicate"],
+    "_labeling": ["LabelingRunner"],
+    "_rules": ["RuleFilter"],
+    "_embed_store": ["EmbeddingStore"],
+    "_onnx_backend": ["OnnxModel", "export_onnx", "parity_check"],
+    "_batch_predict": ["BatchPredictor"],
+    "_score_pipeline": ["TwoStageScorer"],
+    "_token_cache": ["cached_tokenize", "tokenizer_fingerprint"],
+    "_rollup": ["SentimentRollup"],
+    "_query": ["where", "split_by", "eq", "ne", "isin", "not_in", "between"],
+    "_corpus": ["PostCorpus", "CORPUS_SCHEMA"],
+    "dream_cluster": ["DreamCluster"],
+}
+_LAZY_NAMES = {name: module for module, names in _LAZY.items() for name in names}
+
+
+def __getattr__(name):
+    if name not in _LAZY_NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_NAMES[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
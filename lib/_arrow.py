@@ -0,0 +1,97 @@
+import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+def table_and_indices(source):
+    """
+    (physical Arrow table, logical -> physical row map or None) for a
+    datasets.Dataset, honouring select / filter / shuffle without ever
+    flattening the indices mapping; other sources come back as they are.
+    """
+    if hasattr(source, "data") and hasattr(source.data, "table"):
+        indices = getattr(source, "_indices", None)
+        return source.data.table, indices.column(0) if indices is not None else None
+    return source, None
+
+
+def iter_batches(source, batch_rows: int, columns=None):
+    """
+    RecordBatches of at most `batch_rows` rows of `source` (Parquet
+    path(s), a pyarrow Table or a datasets.Dataset) in row order, with only
+    `columns` when given. A Dataset's indices mapping is applied one batch
+    at a time, so only that batch is ever copied.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        source = [source]
+    if isinstance(source, (list, tuple)):
+        for path in source:
+            yield from pq.ParquetFile(path).iter_batches(batch_size=batch_rows, columns=columns)
+        return
+    table, indices = table_and_indices(source)
+    if columns is not None:
+        table = table.select(columns)
+    if indices is None:
+        yield from table.to_batches(max_chunksize=batch_rows)
+        return
+    for start in range(0, len(indices), batch_rows):
+        yield from table.take(indices.slice(start, batch_rows)).to_batches()
+
+
+# replayed MemoryMappedTable transforms that leave rows and values alone
+_ROW_PRESERVING = {"replace_schema_metadata", "drop", "select", "remove_column"}
+
+
+def _block_paths(table):
+    # datasets.table wrappers: a MemoryMappedTable is one file unless a
+    # transform that changes rows or values was replayed on it, a
+    # ConcatenationTable stacks blocks
+    if getattr(table, "path", None):
+        replays = getattr(table, "replays", None) or []
+        return [table.path] if all(name in _ROW_PRESERVING for name, _, _ in replays) else None
+    if hasattr(table, "blocks"):
+        paths = []
+        for row in table.blocks:
+            if len(row) != 1:
+                return None
+            block = _block_paths(row[0])
+            if block is None:
+                return None
+            paths.extend(block)
+        return paths
+    return None
+
+
+def arrow_files(source, column: str):
+    """
+    Paths of the Arrow files backing a datasets.Dataset, in physical row
+    order, when `column` can be read from them as stored; None when it
+    cannot (in-memory tables, pyarrow Tables, transforms not flushed to a
+    cache file).
+    """
+    if not (hasattr(source, "data") and hasattr(source.data, "table")):
+        return None
+    paths = _block_paths(source.data)
+    if not paths:
+        return None
+    tables = [read_arrow_file(path) for path in paths]
+    if any(column not in table.column_names for table in tables):
+        return None
+    return paths if sum(table.num_rows for table in tables) == source.data.num_rows else None
+
+
+def read_arrow_file(path) -> pa.Table:
+    """A datasets cache file as a memory-mapped (zero-copy) Table."""
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_stream(source).read_all()
+
+
+def take_rows(paths, column: str, rows, batch_rows: int):
+    """
+    Yields `column` of the physical `rows` (a range or an index array) of
+    the memory-mapped Arrow files `paths`, `batch_rows` values at a time.
+    """
+    values = pa.concat_tables([read_arrow_file(path).select([column]) for path in paths]).column(column)
+    for start in range(0, len(rows), batch_rows):
+        yield values.take(np.asarray(rows[start:start + batch_rows], dtype=np.int64))
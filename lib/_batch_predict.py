@@ -0,0 +1,120 @@
+import time
+import numpy as np
+from _activations import softmax
+
+
+class BatchPredictor:
+    """
+    Length-bucketed, dynamically padded inference for the classifiers.
+
+    Rows are tokenized without padding, sorted by token length inside a
+    window of `window` rows, and cut into batches that stay under a budget
+    of `max_tokens` padded tokens (rows x longest row), so short tweets run
+    in large batches and nothing is padded to max_length=128. Outputs are
+    returned in the original row order. Works with a PyTorch
+    AutoModelForSequenceClassification (on `device`) or an OnnxModel:
+        predictor = BatchPredictor(model, tokenizer, device=device)
+        logits = predictor.predict(stage_1_source["content"])
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer=None,
+        max_tokens: int = 8192,
+        max_length: int = 128,
+        max_rows: int = 512,
+        window: int = 65_536,
+        device=None,
+    ):
+        self.model = model
+        self.tokenizer = tokenizer or model.tokenizer
+        self.max_tokens = max_tokens
+        self.max_length = max_length
+        self.max_rows = max_rows
+        self.window = window
+        self.device = device
+        self.onnx = hasattr(model, "session")
+        if not self.onnx:
+            model.eval()
+            if device is not None:
+                model.to(device)
+        self.rows_per_sec = 0.0
+        self.padding_ratio = 0.0
+
+    def _batches(self, lengths):
+        # sorted ascending, so the current row is always the longest so far
+        order = np.argsort(lengths, kind="stable")
+        batch = []
+        for i in order:
+            if batch and ((len(batch) + 1) * lengths[i] > self.max_tokens or len(batch) == self.max_rows):
+                yield batch
+                batch = []
+            batch.append(i)
+        if batch:
+            yield batch
+
+    def _forward(self, ids, mask):
+        if self.onnx:
+            feed = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self.model.input_names:
+                feed["token_type_ids"] = np.zeros_like(ids)
+            return self.model.session.run(None, feed)[0]
+        import torch
+        with torch.inference_mode():
+            out = self.model(
+                input_ids=torch.from_numpy(ids).to(self.device or "cpu"),
+                attention_mask=torch.from_numpy(mask).to(self.device or "cpu"),
+            )
+        return out.logits.float().cpu().numpy()
+
+    def encode(self, texts: list[str]) -> list:
+        """Unpadded, truncated input_ids, reusable across models sharing the tokenizer."""
+        return self.tokenizer(list(texts), truncation=True, max_length=self.max_length)["input_ids"]
+
+    def _logits(self, encoded: list):
+        # (logits in input order, real tokens, padded tokens)
+        pad = self.tokenizer.pad_token_id or 0
+        out, real, padded = None, 0, 0
+        for w in range(0, len(encoded), self.window):
+            window = encoded[w:w + self.window]
+            lengths = np.fromiter((len(ids) for ids in window), dtype=np.int64, count=len(window))
+            for batch in self._batches(lengths):
+                width = int(lengths[batch[-1]])
+                ids = np.full((len(batch), width), pad, dtype=np.int64)
+                mask = np.zeros((len(batch), width), dtype=np.int64)
+                for row, i in enumerate(batch):
+                    ids[row, :lengths[i]] = window[i]
+                    mask[row, :lengths[i]] = 1
+                logits = self._forward(ids, mask)
+                if out is None:
+                    out = np.empty((len(encoded), logits.shape[1]), dtype=np.float32)
+                out[w + np.asarray(batch)] = logits
+                real += int(lengths[batch].sum())
+                padded += ids.size
+        return (out if out is not None else np.empty((0, 0), dtype=np.float32)), real, padded
+
+    def predict_ids(self, encoded: list) -> np.ndarray:
+        """Logits for already tokenized rows (see encode), in input order."""
+        start = time.perf_counter()
+        out, real, padded = self._logits(encoded)
+        self.rows_per_sec = len(encoded) / (time.perf_counter() - start) if encoded else 0.0
+        self.padding_ratio = 1 - real / padded if padded else 0.0
+        return out
+
+    def predict(self, texts: list[str]) -> np.ndarray:
+        """Logits for every text, in input order."""
+        texts = list(texts)
+        start = time.perf_counter()
+        parts, real, padded = [], 0, 0
+        for w in range(0, len(texts), self.window):
+            logits, window_real, window_padded = self._logits(self.encode(texts[w:w + self.window]))
+            parts.append(logits)
+            real += window_real
+            padded += window_padded
+        self.rows_per_sec = len(texts) / (time.perf_counter() - start) if texts else 0.0
+        self.padding_ratio = 1 - real / padded if padded else 0.0
+        return np.concatenate(parts) if parts else np.empty((0, 0), dtype=np.float32)
+
+    def predict_proba(self, texts: list[str]) -> np.ndarray:
+        return softmax(self.predict(texts))
@@ -0,0 +1,172 @@
+import hashlib, inspect, os, sqlite3, unicodedata
+import jaconv, emoji
+import _cleaner
+from _cleaner import TwitterCleaner
+
+# SQLite caps the number of bound parameters per statement (999 on older builds)
+_CHUNK = 900
+
+
+def cleaner_fingerprint(cleaner=None, version: str = None) -> str:
+    """
+    Short hash of everything that decides what `cleaner` outputs. For a
+    TwitterCleaner (the default) that is the source of its class and of
+    every class it inherits from, the whole _cleaner module (the helpers
+    and compiled rules it calls), and the jaconv / emoji / unicode data
+    versions, so any rule change yields a new fingerprint. Any other
+    cleaner can't be inspected reliably and needs an explicit `version`,
+    which is hashed with its class name; bump it whenever it changes.
+    """
+    cleaner = cleaner or TwitterCleaner()
+    h = hashlib.blake2b(digest_size=8)
+    if version is not None:
+        h.update(f"{type(cleaner).__module__}.{type(cleaner).__qualname__}|{version}".encode())
+    elif isinstance(cleaner, TwitterCleaner):
+        for klass in type(cleaner).__mro__[:-1]:
+            try:
+                h.update(inspect.getsource(klass).encode())
+            except (OSError, TypeError):
+                raise Exception(f"can't read the source of {klass.__name__}; pass a version for the cache fingerprint")
+        h.update(inspect.getsource(_cleaner).encode())
+        for name in sorted(vars(_cleaner)):
+            value = getattr(_cleaner, name)
+            if hasattr(value, "pattern") and hasattr(value, "flags"):
+                h.update(f"{name}={value.pattern!r}/{value.flags}".encode())
+    else:
+        raise Exception("a custom cleaner needs a version string for the cache fingerprint")
+    h.update(getattr(jaconv, "__version__", "?").encode())
+    h.update(getattr(emoji, "__version__", "?").encode())
+    h.update(unicodedata.unidata_version.encode())
+    return h.hexdigest()
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+class CleaningCache:
+    """
+    Persistent, content-addressed cache in front of a cleaner (TwitterCleaner
+    by default).
+
+    Entries are keyed on (cleaner fingerprint, blake2b of the raw text), so
+    re-runs only clean new or changed tweets and a rule change in _cleaner
+    silently stops every old entry from matching. A custom `cleaner` needs a
+    `version`, see cleaner_fingerprint. Works as a batched map:
+        ds.map(CleaningCache("cache/clean_cache.sqlite"), batched=True, num_proc=...)
+    Hit/miss counters are kept per instance and, per fingerprint, in the
+    database itself so runs split over several worker processes add up.
+    """
+
+    def __init__(self, path: str = "cache/clean_cache.sqlite", column: str = "content", cleaner=None, version: str = None):
+        self.path = path
+        self.column = column
+        self.cleaner = cleaner or TwitterCleaner(column)
+        self.fingerprint = cleaner_fingerprint(self.cleaner, version)
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=120)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cleaned ("
+                "fingerprint TEXT NOT NULL, digest BLOB NOT NULL, text TEXT NOT NULL, "
+                "PRIMARY KEY (fingerprint, digest)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats ("
+                "fingerprint TEXT PRIMARY KEY, hits INTEGER NOT NULL, misses INTEGER NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def __getstate__(self):
+        # sqlite connections don't survive pickling into datasets workers
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+
+    def _lookup(self, conn, digests):
+        found = {}
+        for start in range(0, len(digests), _CHUNK):
+            chunk = digests[start:start + _CHUNK]
+            rows = conn.execute(
+                "SELECT digest, text FROM cleaned WHERE fingerprint = ? AND digest IN (%s)"
+                % ",".join("?" * len(chunk)),
+                [self.fingerprint, *chunk],
+            )
+            found.update(rows)
+        return found
+
+    def clean_batch(self, texts: list[str]) -> list[str]:
+        conn = self._connect()
+        digests = [_digest(text) for text in texts]
+        found = self._lookup(conn, list(set(digests)))
+        missing = {}
+        for digest, text in zip(digests, texts):
+            if digest not in found and digest not in missing:
+                missing[digest] = text
+        if missing:
+            cleaned = self.cleaner.clean_batch(list(missing.values()))
+            fresh = dict(zip(missing.keys(), cleaned))
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO cleaned (fingerprint, digest, text) VALUES (?, ?, ?)",
+                    [(self.fingerprint, digest, text) for digest, text in fresh.items()],
+                )
+            found.update(fresh)
+        # a text repeated within the batch is cleaned once and counted once
+        misses = len(missing)
+        hits = len(digests) - misses
+        self.hits += hits
+        self.misses += misses
+        with conn:
+            conn.execute(
+                "INSERT INTO stats (fingerprint, hits, misses) VALUES (?, ?, ?) "
+                "ON CONFLICT(fingerprint) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses",
+                (self.fingerprint, hits, misses),
+            )
+        return [found[digest] for digest in digests]
+
+    def clean(self, text: str) -> str:
+        return self.clean_batch([text])[0]
+
+    def __call__(self, batch):
+        batch[self.column] = self.clean_batch(batch[self.column])
+        return batch
+
+    def stats(self) -> dict:
+        """Counters for this instance plus the lifetime totals for this fingerprint."""
+        row = self._connect().execute(
+            "SELECT hits, misses FROM stats WHERE fingerprint = ?", (self.fingerprint,)
+        ).fetchone() or (0, 0)
+        seen = self.hits + self.misses
+        return {
+            "fingerprint": self.fingerprint,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / seen if seen else 0.0,
+            "total_hits": row[0],
+            "total_misses": row[1],
+        }
+
+    def prune(self) -> int:
+        """Drops entries written under any other cleaner fingerprint."""
+        conn = self._connect()
+        with conn:
+            deleted = conn.execute("DELETE FROM cleaned WHERE fingerprint != ?", (self.fingerprint,)).rowcount
+            conn.execute("DELETE FROM stats WHERE fingerprint != ?", (self.fingerprint,))
+        conn.execute("VACUUM")
+        return deleted
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
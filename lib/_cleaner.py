@@ -1,4 +1,5 @@
 import re, unicodedata, jaconv, emoji
+from functools import lru_cache
 
 _URL      = re.compile(r'https?://\S+')
 _MENTION  = re.compile(r'@\w+')
@@ -57,4 +58,143 @@ def clean_twitter_text(row: str):
     text = _REPEAT.sub(r'\1', text)
     text = _WS.sub(' ', text).strip().lower()
     row["content"] = text #type: ignore
-    return row
\ No newline at end of file
+    return row
+
+# --- COMPILED ENGINE ---
+# Same output as clean_twitter_text, but each regex scan is either merged
+# with its neighbour or skipped when a cheap check proves it cannot match.
+# URL and mention share one scan: the mention may not run into a URL start,
+# which is exactly what the sequential URL-then-mention order produces.
+_URL_OR_MENTION = re.compile(r'(https?://\S+)|@(?:(?!https?://\S)\w)+')
+_RT             = re.compile(r'rt\s+', re.I)
+_YEAR_GLUED     = re.compile(r'(\b\d{4})(?=[a-zA-Z])')
+_KUTIPAN        = re.compile(r'kutipan', re.I)
+_DARI           = re.compile(r'dari', re.I)
+_DARI_DOMAIN    = re.compile(r'dari\s+[a-z0-9.-]+\.[a-z]{2,}\b', re.I)
+# A _DARI_STUCK match always starts a whitespace-delimited run (the greedy
+# \S+ would otherwise have reached back further), so pin it there instead
+# of letting \S+ backtrack from every character of every word.
+_DARI_STUCK_RUN = re.compile(r'(?<!\S)(\S+)dari\b', re.I)
+
+
+def _url_or_mention(match):
+    return ' <url> ' if match.group(1) else '@USER'
+
+
+def _z2h_residual_table():
+    # jaconv.z2h is a per-character translate; after NFKC almost every
+    # full-width char is already gone, so only keep what NFKC leaves behind.
+    source = ''.join(chr(cp) for cp in range(0x10000) if not 0xD800 <= cp <= 0xDFFF)
+    target = jaconv.z2h(source, kana=False, digit=True, ascii=True)
+    if len(source) != len(target):
+        return None
+    table = {}
+    for src, dst in zip(source, target):
+        if src != dst and unicodedata.normalize('NFKC', src) == src:
+            table[ord(src)] = dst
+    return table
+
+
+def _emoji_hint():
+    # emoji.demojize walks the string char by char in Python. It can only
+    # change a string that holds an emoji start char or a variation selector
+    # (which it always drops), so search for those first in C. Nearby code
+    # points are merged into ranges: a long list of astral literals makes
+    # the character class itself a linear scan.
+    points = {0xFE0E, 0xFE0F}
+    for key in emoji.EMOJI_DATA:
+        points.add(ord(key[1] if key[0].isascii() and len(key) > 1 else key[0]))
+    ranges = []
+    for cp in sorted(points):
+        if ranges and cp - ranges[-1][1] <= 64:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    return '[' + ''.join(re.escape(chr(lo)) + '-' + re.escape(chr(hi)) for lo, hi in ranges) + ']'
+
+
+@lru_cache(maxsize=65536)
+def _demojize_segment(segment):
+    return emoji.demojize(segment, delimiters=(' ', ' '))
+
+
+def _demojize_match(match):
+    return _demojize_segment(match.group())
+
+
+class TwitterCleaner:
+    """
+    Compiled, batch-friendly version of clean_twitter_text.
+
+    Usable directly with datasets:
+        ds.map(TwitterCleaner(), batched=True, num_proc=...)
+    or on plain lists through clean_batch.
+    """
+
+    def __init__(self, column: str = "content"):
+        self.column = column
+        self._z2h = _z2h_residual_table()
+        hint = _emoji_hint()
+        self._emoji = re.compile(hint)
+        # No emoji sequence spans a space, so demojize can run per
+        # space-separated segment and the (few, repetitive) segments cached.
+        self._emoji_segment = re.compile('[^ ]*' + hint + '[^ ]*')
+
+    def clean(self, text: str) -> str:
+        text = unicodedata.normalize('NFKC', text)
+        if self._z2h is None:
+            text = jaconv.z2h(text, kana=False, digit=True, ascii=True)
+        elif self._z2h:
+            text = text.translate(self._z2h)
+        text = text.replace("tanya grok", " ")
+        text = text.replace("grokproductivitypasang", " ")
+        text = text.replace('\\n', ' ').replace('\\r', ' ')
+
+        if '://' in text or '@' in text:
+            text = _URL_OR_MENTION.sub(_url_or_mention, text)
+        text = text.replace('<url> ini tidak tersedia', ' ')
+
+        rt = _RT.match(text)
+        if rt:
+            text = text[rt.end():]
+        text = _YEAR_GLUED.sub(r'\1 ', text)
+        cut = _KUTIPAN.search(text)
+        if cut:
+            text = text[:cut.start()]
+
+        # --- RULE ORDER IS IMPORTANT --- (see clean_twitter_text)
+        if _DARI.search(text):
+            if _DARI_DOMAIN.search(text):
+                text = _DARI_URL_ATTACHED.sub(r'\1', text)
+                text = _DARI_URL_SPACED.sub('', text)
+            text = _DARI_STUCK_RUN.sub(r'\1', text)
+        if '.' in text:
+            text = _DOMAIN_ONLY.sub(' ', text)
+
+        if not text.isascii() and self._emoji.search(text):
+            text = self._emoji_segment.sub(_demojize_match, text)
+        text = _REPEAT.sub(r'\1', text)
+        # str.split() and \s share the same whitespace definition
+        return ' '.join(text.split()).lower()
+
+    def clean_batch(self, texts: list[str]) -> list[str]:
+        clean = self.clean
+        return [clean(text) for text in texts]
+
+    def __call__(self, batch):
+        batch[self.column] = self.clean_batch(batch[self.column])
+        return batch
+
+
+def check_against_reference(texts, cleaner=None):
+    """
+    Golden-output check: runs clean_twitter_text and TwitterCleaner over the
+    same texts and returns every (raw, expected, got) triple that differs.
+    """
+    cleaner = cleaner or TwitterCleaner()
+    mismatches = []
+    for raw, got in zip(texts, cleaner.clean_batch(list(texts))):
+        expected = clean_twitter_text({"content": raw})["content"]
+        if expected != got:
+            mismatches.append((raw, expected, got))
+    return mismatches
@@ -0,0 +1,191 @@
+import os, shutil, uuid
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from _ingest import POST_SCHEMA
+from _normalize import TextNormalizer
+from _arrow import iter_batches
+from _score_pipeline import SCORE_FIELDS
+
+# Post fields, the cleaned text and the TwoStageScorer outputs; `month`
+# (YYYY-MM of `time`) is not stored in the files, it is the directory name.
+CORPUS_SCHEMA = pa.schema(list(POST_SCHEMA) + [("clean_content", pa.string())] + SCORE_FIELDS)
+
+
+class PostCorpus:
+    """
+    Local copy of the posts as Parquet partitioned by month:
+        <root>/month=2024-08/part-<id>.parquet
+    with the columns of CORPUS_SCHEMA, one file per month. Rows are sorted by
+    `time` and written in row groups of `row_group_size`, so the min/max
+    statistics of a row group cover a narrow time span.
+
+    read() / iter_batches() push the date range down twice: months outside
+    it are never opened, and inside the boundary months only row groups
+    whose `time` statistics overlap the range are decoded. Only the
+    requested columns are read:
+        corpus = PostCorpus("data/corpus")
+        corpus.write(dataset["source_labeled"])
+        window = corpus.read("2024-08-19", "2024-08-26", columns=["time", "sentiment"])
+        scorer.run(corpus.files("2025-03"), "out/rescored.parquet")
+    Bounds are ISO strings (dates or timestamps) compared against the
+    stored `time` text: start is inclusive, end exclusive.
+    """
+
+    def __init__(self, root: str, row_group_size: int = 32_768, profile: str = "indobertweet"):
+        self.root = root
+        self.row_group_size = row_group_size
+        self.normalizer = TextNormalizer(profile, column="content", columns={profile: "clean_content"}) if profile else None
+        self.profile = profile
+        os.makedirs(root, exist_ok=True)
+
+    def _conform(self, batch) -> pa.Table:
+        table = pa.Table.from_batches([batch])
+        columns = []
+        for field in CORPUS_SCHEMA:
+            if field.name in table.column_names:
+                columns.append(table.column(field.name).cast(field.type))
+            elif field.name == "clean_content" and self.normalizer is not None and "content" in table.column_names:
+                texts = [text or "" for text in table.column("content").to_pylist()]
+                columns.append(pa.array(self.normalizer.normalize_batch(texts)[self.profile], pa.string()))
+            else:
+                columns.append(pa.nulls(table.num_rows, field.type))
+        return pa.Table.from_arrays(columns, schema=CORPUS_SCHEMA)
+
+    def months(self) -> list:
+        """Months present in the corpus, oldest first."""
+        return sorted(
+            name.split("=", 1)[1] for name in os.listdir(self.root)
+            if name.startswith("month=") and os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def _latest(self, table: pa.Table) -> pa.Table:
+        # one row per tweet_id, the last one in `table` order; rows without
+        # a tweet_id cannot be matched and are all kept
+        ids = table.column("tweet_id")
+        valid = pc.is_valid(ids).to_numpy(zero_copy_only=False)
+        rows = pa.table({"tweet_id": ids, "row": np.arange(table.num_rows)}).filter(pa.array(valid))
+        last = rows.group_by("tweet_id").aggregate([("row", "max")]).column("row_max").to_numpy()
+        return table.take(np.sort(np.concatenate([last, np.flatnonzero(~valid)])))
+
+    def write(self, source, mode: str = "append", batch_rows: int = 262_144) -> dict:
+        """
+        Adds `source` (a Dataset, a pyarrow Table or Parquet path(s)) to the
+        corpus. Columns outside CORPUS_SCHEMA are dropped and missing ones
+        are null, except clean_content, which is filled from `content` with
+        the normalizer profile.
+
+        Every month that `source` touches is rewritten as a single file
+        sorted by `time`, one month at a time: mode="append" merges the new
+        rows with the month's current posts, keeping the newest row per
+        tweet_id (so writing the same export twice, or a re-scored copy of
+        it, does not grow the corpus), and mode="overwrite" replaces the
+        month with just the new rows. Other months are left alone. New
+        files are only moved into place once every month is compacted, and
+        a month's old files are removed only after its new one is in.
+        Returns the number of posts per rewritten month.
+        """
+        if mode not in ("append", "overwrite"):
+            raise Exception("mode must either be append or overwrite")
+        staging = os.path.join(self.root, f".staging-{uuid.uuid4().hex}")
+        spills = {}
+        try:
+            for batch in iter_batches(source, batch_rows):
+                table = self._conform(batch)
+                table = table.filter(pc.is_valid(table.column("time")))
+                if not table.num_rows:
+                    continue
+                months = pc.utf8_slice_codeunits(table.column("time"), 0, 7)
+                for month in pc.unique(months).to_pylist():
+                    directory = os.path.join(staging, "spill", f"month={month}")
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, f"{len(spills.get(month, [])):06d}.parquet")
+                    pq.write_table(table.filter(pc.equal(months, month)), path)
+                    spills.setdefault(month, []).append(path)
+            counts, replaced, compacted = {}, 0, {}
+            for month, paths in sorted(spills.items()):
+                old = self.files(month, month) if mode == "append" else []
+                new = pa.concat_tables([pq.read_table(path, schema=CORPUS_SCHEMA) for path in paths])
+                table = pa.concat_tables([pq.read_table(path, schema=CORPUS_SCHEMA) for path in old] + [new])
+                table = self._latest(table).sort_by("time")
+                replaced += new.num_rows - (table.num_rows - sum(pq.ParquetFile(path).metadata.num_rows for path in old))
+                directory = os.path.join(staging, f"month={month}")
+                os.makedirs(directory)
+                path = os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet")
+                pq.write_table(table, path, row_group_size=self.row_group_size)
+                compacted[month] = path
+                counts[month] = table.num_rows
+            for month, path in compacted.items():
+                # new part in first, old parts out after: a crash in between
+                # leaves duplicates, which the next append folds away, never
+                # a month without its posts
+                target = os.path.join(self.root, f"month={month}")
+                old = self.files(month, month)
+                os.makedirs(target, exist_ok=True)
+                os.replace(path, os.path.join(target, os.path.basename(path)))
+                for stale in old:
+                    os.remove(stale)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        print(f"Rewrote {len(counts)} month partition(s) of {self.root} with {sum(counts.values()):,} posts"
+              + (f" ({replaced:,} duplicate tweet_id(s) replaced by the newest row)" if replaced else ""))
+        return counts
+
+    def _months_between(self, start, end) -> list:
+        return [
+            month for month in self.months()
+            if (start is None or month >= str(start)[:7]) and (end is None or month <= str(end)[:7])
+        ]
+
+    def files(self, start=None, end=None) -> list:
+        """
+        Paths of the files of every month overlapping [start, end), for
+        the readers that take Parquet paths (TwoStageScorer.run,
+        SentimentRollup.update, Dataset.from_parquet). Whole months only;
+        use read() or iter_batches() to cut at exact timestamps.
+        """
+        paths = []
+        for month in self._months_between(start, end):
+            directory = os.path.join(self.root, f"month={month}")
+            paths.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith(".parquet"))
+        return paths
+
+    def _scan(self, start, end, filter):
+        paths = self.files(start, end)
+        if not paths:
+            return None, None
+        dataset = ds.dataset(paths, schema=CORPUS_SCHEMA, format="parquet")
+        expression = filter
+        for bound in (
+            pc.field("time") >= str(start) if start is not None else None,
+            pc.field("time") < str(end) if end is not None else None,
+        ):
+            if bound is not None:
+                expression = bound if expression is None else expression & bound
+        return dataset, expression
+
+    def read(self, start=None, end=None, columns=None, filter=None) -> pa.Table:
+        """
+        Posts with start <= time < end as a pyarrow Table with only
+        `columns` (all of CORPUS_SCHEMA by default). `filter` is an extra
+        pyarrow.compute expression, e.g. pc.field("relevant") == True,
+        which is pushed down to the row-group statistics as well.
+        """
+        dataset, expression = self._scan(start, end, filter)
+        if dataset is None:
+            return CORPUS_SCHEMA.empty_table().select(columns) if columns else CORPUS_SCHEMA.empty_table()
+        return dataset.to_table(columns=columns, filter=expression)
+
+    def iter_batches(self, start=None, end=None, columns=None, filter=None, batch_rows: int = 65_536):
+        """Same selection as read(), streamed as RecordBatches."""
+        dataset, expression = self._scan(start, end, filter)
+        if dataset is None:
+            return
+        yield from dataset.to_batches(columns=columns, filter=expression, batch_size=batch_rows)
+
+    def to_dataset(self, start=None, end=None, columns=None, filter=None):
+        """read() wrapped as a datasets.Dataset, for the notebook code paths."""
+        from datasets import Dataset
+        return Dataset(self.read(start, end, columns, filter))
@@ -0,0 +1,205 @@
+import hashlib, os, re, zlib
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from joblib import Parallel, delayed
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from _arrow import arrow_files, table_and_indices, take_rows
+
+# Retweets and copy-paste campaigns mostly differ by who they mention or
+# which link they carry, so those never take part in the near-dup shingles.
+_NOISE = re.compile(r'https?://\S+|<url>|@\w+', re.I)
+_TOKEN = re.compile(r'\w+')
+# smallest prime above 2**32: (a * x + b) % _PRIME never overflows uint64
+# for 32-bit shingle hashes and 32-bit a, b
+_PRIME = np.uint64(4294967311)
+
+
+def _exact_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "little")
+
+
+def _shingle_hashes(text: str, size: int) -> list:
+    # empty for texts that are only mentions / links / punctuation: those
+    # would all share one MinHash signature, so they only match exactly
+    text = _NOISE.sub(" ", text.lower())
+    tokens = _TOKEN.findall(text)
+    if not tokens:
+        return []
+    if len(tokens) <= size:
+        shingles = [" ".join(tokens)]
+    else:
+        shingles = [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+    return [zlib.crc32(s.encode("utf-8", "surrogatepass")) for s in shingles]
+
+
+def _params(num_perm, bands, seed):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**32, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 2**32, size=num_perm, dtype=np.uint64)
+    mix = rng.integers(1, 2**63, size=num_perm // bands, dtype=np.uint64) | np.uint64(1)
+    return a, b, mix
+
+
+def _hash_texts(texts, near, num_perm, bands, shingle_size, seed, batch_size):
+    """
+    Exact 64-bit hashes, LSH band keys and a mask of the rows that have
+    shingles (the only ones whose band keys mean anything) for some texts.
+    """
+    exact = np.fromiter((_exact_hash(t or "") for t in texts), dtype=np.uint64, count=len(texts))
+    if not near:
+        return exact, None, None
+    a, b, mix = _params(num_perm, bands, seed)
+    rows = num_perm // bands
+    keys = np.zeros((len(texts), bands), dtype=np.uint64)
+    shingled = np.zeros(len(texts), dtype=bool)
+    for start in range(0, len(texts), batch_size):
+        chunk = texts[start:start + batch_size]
+        per_row = [_shingle_hashes(t or "", shingle_size) for t in chunk]
+        counts = np.fromiter((len(h) for h in per_row), dtype=np.int64, count=len(per_row))
+        present = np.flatnonzero(counts)
+        shingled[start + present] = True
+        if not len(present):
+            continue
+        flat = np.fromiter((h for hs in per_row for h in hs), dtype=np.uint64, count=int(counts.sum()))
+        offsets = np.concatenate(([0], np.cumsum(counts[present])[:-1]))
+        # (num_perm, n_shingles) permuted hashes, minimum per row segment
+        signatures = np.minimum.reduceat((a[:, None] * flat[None, :] + b[:, None]) % _PRIME, offsets, axis=1)
+        banded = signatures.T.reshape(len(present), bands, rows)
+        keys[start + present] = (banded * mix).sum(axis=2)  # wraps mod 2**64, fine for a key
+    return exact, keys, shingled
+
+
+def _join(parts, *args):
+    # per-batch (exact, keys, shingled) -> one triple
+    if not parts:
+        return _hash_texts([], *args)
+    exact = np.concatenate([p[0] for p in parts])
+    if parts[0][1] is None:
+        return exact, None, None
+    return exact, np.concatenate([p[1] for p in parts]), np.concatenate([p[2] for p in parts])
+
+
+def _hash_shard(path, column, *args):
+    # one record batch at a time; only its digests outlive the batch
+    return _join([
+        _hash_texts(batch.column(0).to_pylist(), *args)
+        for batch in pq.ParquetFile(path).iter_batches(columns=[column])
+    ], *args)
+
+
+def _hash_rows(paths, column, rows, *args):
+    # physical `rows` of memory-mapped Dataset files, batch by batch
+    batch_size = args[-1]
+    return _join([_hash_texts(chunk.to_pylist(), *args) for chunk in take_rows(paths, column, rows, batch_size)], *args)
+
+
+def _hash_array(array, *args):
+    return _hash_texts(array.to_pylist(), *args)
+
+
+def _group_edges(keys):
+    # every row is linked to the first row carrying the same key
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.ones(len(keys), dtype=bool)
+    starts[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    first = order[np.maximum.accumulate(np.where(starts, np.arange(len(keys)), 0))]
+    linked = first != order
+    return first[linked], order[linked]
+
+
+def deduplicate(
+    source,
+    column: str = "content",
+    near: bool = True,
+    num_perm: int = 64,
+    bands: int = 16,
+    shingle_size: int = 2,
+    seed: int = 42,
+    batch_size: int = 2048,
+    n_jobs: int = -1,
+):
+    """
+    Streaming exact + near-duplicate detection over Arrow data.
+
+    Each shard is hashed in its own joblib worker: a 64-bit blake2b of the
+    raw text for exact duplicates and, when `near` is set, a MinHash
+    signature over word shingles (mentions and URLs removed) cut into
+    `bands` LSH band keys. Only those hashes come back to the parent, where
+    rows sharing an exact hash or any band key are joined into clusters.
+    With the defaults (64 permutations, 16 bands of 4) tweets whose shingle
+    Jaccard similarity is above ~0.5 are very likely to end up together.
+    Texts with no words left (only mentions / links, or empty) have no
+    shingles and are only merged with exact copies.
+
+    Args:
+        source: Parquet shard path(s), a pyarrow Table or a datasets.Dataset.
+            Tables and datasets are split into n_jobs contiguous slices. A
+            Dataset backed by Arrow files (load_dataset, load_from_disk,
+            cached map) is never copied: workers memory-map the files and
+            read their rows through its indices mapping batch by batch;
+            only in-memory data is sent to workers as text.
+        column: Text column to compare.
+        near: False only merges exact duplicates, i.e. the same result as
+            drop_duplicates(subset=column, keep="first").
+        num_perm, bands, shingle_size, seed: MinHash / LSH settings;
+            num_perm must be divisible by bands.
+        batch_size: Rows hashed together inside a worker.
+        n_jobs: joblib workers.
+    Returns:
+        A pyarrow Table aligned with the input rows, with `cluster_id` (the
+        row index of the cluster's first member) and `keep` (True for that
+        first member only).
+    """
+    if num_perm % bands:
+        raise Exception("num_perm must be divisible by bands")
+    args = (near, num_perm, bands, shingle_size, seed, batch_size)
+    if isinstance(source, (str, os.PathLike)):
+        source = [source]
+    if isinstance(source, (list, tuple)):
+        tasks = [delayed(_hash_shard)(path, column, *args) for path in source]
+    else:
+        table, indices = table_and_indices(source)
+        n = len(indices) if indices is not None else table.num_rows
+        workers = os.cpu_count() if n_jobs == -1 else max(1, n_jobs)
+        step = max(1, -(-n // workers))
+        paths = arrow_files(source, column)
+        if paths:
+            # workers map the files themselves and only get row positions
+            rows = indices.to_numpy() if indices is not None else range(n)
+            tasks = [delayed(_hash_rows)(paths, column, rows[i:i + step], *args) for i in range(0, n, step)]
+        else:
+            texts = table.column(column)
+            tasks = [
+                delayed(_hash_array)(texts.take(indices.slice(i, step)) if indices is not None else texts.slice(i, step), *args)
+                for i in range(0, n, step)
+            ]
+    results = Parallel(n_jobs=n_jobs)(tasks)
+
+    exact = np.concatenate([r[0] for r in results]) if results else np.empty(0, dtype=np.uint64)
+    n = len(exact)
+    if not n:
+        print("Rows: 0, nothing to deduplicate")
+        return pa.table({"cluster_id": pa.array([], pa.int64()), "keep": pa.array([], pa.bool_())})
+    edges = [_group_edges(exact)]
+    if near:
+        keys = np.concatenate([r[1] for r in results])
+        rows = np.flatnonzero(np.concatenate([r[2] for r in results]))
+        for band in range(bands):
+            src, dst = _group_edges(keys[rows, band])
+            edges.append((rows[src], rows[dst]))
+    src = np.concatenate([e[0] for e in edges])
+    dst = np.concatenate([e[1] for e in edges])
+    graph = coo_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n, n))
+    _, components = connected_components(graph, directed=False)
+    first = np.full(components.max() + 1 if n else 0, n, dtype=np.int64)
+    np.minimum.at(first, components, np.arange(n))
+    cluster_id = first[components]
+    keep = cluster_id == np.arange(n)
+
+    n_exact = n - len(np.unique(exact))
+    print(f"Rows: {n:,}, exact duplicates: {n_exact:,}, "
+          f"near duplicates: {n - int(keep.sum()) - n_exact:,}, kept: {int(keep.sum()):,}")
+    return pa.table({"cluster_id": cluster_id, "keep": keep})
@@ -0,0 +1,223 @@
+import glob, hashlib, json, os, re, time, uuid
+import numpy as np
+
+_DIGEST = "S16"
+
+
+def _digests(texts) -> np.ndarray:
+    return np.array(
+        [hashlib.blake2b(t.encode("utf-8", "surrogatepass"), digest_size=16).digest() for t in texts],
+        dtype=_DIGEST,
+    )
+
+
+class EmbeddingStore:
+    """
+    On-disk sentence embeddings keyed by (model, blake2b of the text).
+
+    Vectors live in append-only .npy shards under <root>/<model>/, each
+    with a matching keys file; a shard only becomes visible once its keys
+    file is renamed into place, so an interrupted encode never leaves a
+    half-written shard behind. Shard names carry a timestamp and a uuid,
+    so two processes encoding into the same store never collide. The
+    vector dtype is recorded in manifest.json, and opening the store with
+    another dtype is an error rather than a silent mix.
+
+    get() encodes just the texts the store has not seen yet and returns the
+    requested rows, in order:
+        store = EmbeddingStore("LazarusNLP/all-nusabert-large-v4")
+        embeddings = store.get(ds["content"])
+        reduced, labels, probs = cluster_custom(embeddings)
+    When those rows are one contiguous run of a shard (a corpus encoded in
+    one go and asked for in the same order) the result is a read-only slice
+    of the shard memmap, with no copy at all. Otherwise the rows are
+    gathered from the shard memmaps into an ordered view under views/,
+    keyed on the sequence of digests, and at most `max_views` of those are
+    kept (least recently used are deleted). max_views=0 gathers into
+    memory instead. locate() gives the (shard, row) pairs behind a list of
+    texts for callers that want to index `store.shards` themselves.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        root: str = "cache/embeddings",
+        encoder=None,
+        dtype: str = "float32",
+        shard_rows: int = 100_000,
+        batch_size: int = 128,
+        normalize: bool = True,
+        device: str = None,
+        cache_folder: str = None,
+        max_views: int = 2,
+    ):
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self.dir = os.path.join(root, re.sub(r"[^\w.-]+", "__", model_name) + ("" if normalize else "-raw"))
+        self.shard_rows = shard_rows
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self.device = device
+        self.cache_folder = cache_folder
+        self.max_views = max_views
+        self._encoder = encoder
+        os.makedirs(os.path.join(self.dir, "views"), exist_ok=True)
+        self._check_manifest()
+        self._load_index()
+
+    def _check_manifest(self):
+        path = os.path.join(self.dir, "manifest.json")
+        manifest = {"model_name": self.model_name, "dtype": self.dtype.str, "normalize": self.normalize}
+        if os.path.exists(path):
+            with open(path) as f:
+                stored = json.load(f)
+            if stored.get("dtype") != manifest["dtype"]:
+                raise Exception(
+                    f"{self.dir} holds {np.dtype(stored['dtype']).name} vectors, not {self.dtype.name}; "
+                    f"open it with dtype=\"{np.dtype(stored['dtype']).name}\" or use another root"
+                )
+            return
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, path)
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            from sentence_transformers import SentenceTransformer
+            self._encoder = SentenceTransformer(self.model_name, cache_folder=self.cache_folder, device=self.device)
+        return self._encoder
+
+    def _load_index(self):
+        self._shards, keys, shard_of, row_of = [], [], [], []
+        # a keys file is only renamed into place after its vectors are complete
+        for i, path in enumerate(sorted(glob.glob(os.path.join(self.dir, "keys-*.npy")))):
+            k = np.load(path)
+            self._shards.append(np.load(path.replace("keys-", "vecs-"), mmap_mode="r"))
+            keys.append(k)
+            shard_of.append(np.full(len(k), i, dtype=np.int32))
+            row_of.append(np.arange(len(k), dtype=np.int64))
+        if keys:
+            keys = np.concatenate(keys)
+            order = np.argsort(keys, kind="stable")
+            self._keys = keys[order]
+            self._shard_of = np.concatenate(shard_of)[order]
+            self._row_of = np.concatenate(row_of)[order]
+        else:
+            self._keys = np.empty(0, dtype=_DIGEST)
+            self._shard_of = np.empty(0, dtype=np.int32)
+            self._row_of = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def shards(self) -> list:
+        """Read-only memmaps of the vector shards, indexed by locate()'s shard ids."""
+        return self._shards
+
+    def _find(self, digests):
+        pos = np.searchsorted(self._keys, digests)
+        pos = np.minimum(pos, max(len(self._keys) - 1, 0))
+        found = self._keys[pos] == digests if len(self._keys) else np.zeros(len(digests), dtype=bool)
+        return pos, found
+
+    def _write_shard(self, keys, vectors):
+        # unique per writer, and sorts in write order
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:12]}.npy"
+        vec_path = os.path.join(self.dir, "vecs-" + name)
+        key_path = os.path.join(self.dir, "keys-" + name)
+        # temporaries end in .tmp, never .npy, so no glob over the store
+        # (shard loading, view eviction) can pick up a half-written file;
+        # np.save only keeps such a name when given an open file
+        for path, array in ((vec_path, vectors.astype(self.dtype, copy=False)), (key_path, keys)):
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, path)
+
+    def add(self, texts) -> int:
+        """Encodes and stores every text not in the store yet; returns how many."""
+        texts = list(texts)
+        return self._add(texts, _digests(texts))
+
+    def _add(self, texts, digests) -> int:
+        _, found = self._find(digests)
+        missing = {}
+        for digest, text, seen in zip(digests.tolist(), texts, found.tolist()):
+            if not seen and digest not in missing:
+                missing[digest] = text
+        if not missing:
+            return 0
+        items = list(missing.items())
+        for start in range(0, len(items), self.shard_rows):
+            chunk = items[start:start + self.shard_rows]
+            vectors = self.encoder.encode(
+                [text for _, text in chunk],
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=self.normalize,
+                show_progress_bar=True,
+            )
+            self._write_shard(np.array([d for d, _ in chunk], dtype=_DIGEST), vectors)
+        self._load_index()
+        print(f"Encoded {len(items):,} new texts with {self.model_name} ({len(self):,} stored)")
+        return len(items)
+
+    def locate(self, texts) -> tuple:
+        """(shard ids, row ids) of `texts` in `shards`, encoding what is missing."""
+        texts = list(texts)
+        digests = _digests(texts)
+        self._add(texts, digests)
+        pos, _ = self._find(digests)
+        return self._shard_of[pos], self._row_of[pos]
+
+    def _gather(self, shards, rows, out, chunk_rows):
+        for start in range(0, len(rows), chunk_rows):
+            s_chunk, r_chunk = shards[start:start + chunk_rows], rows[start:start + chunk_rows]
+            block = out[start:start + len(r_chunk)]
+            for s in np.unique(s_chunk):
+                mask = s_chunk == s
+                block[mask] = self._shards[s][r_chunk[mask]]
+        return out
+
+    def _evict_views(self, keep):
+        views = sorted(glob.glob(os.path.join(self.dir, "views", "*.npy")), key=os.path.getmtime, reverse=True)
+        for path in [v for v in views if v != keep][max(self.max_views - 1, 0):]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, texts, chunk_rows: int = 50_000) -> np.ndarray:
+        """Rows for `texts`, in order (encoding what is missing); read-only when memory-mapped."""
+        texts = list(texts)
+        if not texts:
+            dim = self._shards[0].shape[1] if self._shards else 0
+            return np.empty((0, dim), dtype=self.dtype)
+        digests = _digests(texts)
+        self._add(texts, digests)
+        pos, _ = self._find(digests)
+        shards, rows = self._shard_of[pos], self._row_of[pos]
+        if (shards == shards[0]).all() and (np.diff(rows) == 1).all():
+            return self._shards[shards[0]][rows[0]:rows[-1] + 1]
+        dim = self._shards[0].shape[1]
+        if not self.max_views:
+            return self._gather(shards, rows, np.empty((len(texts), dim), dtype=self.dtype), chunk_rows)
+        view = os.path.join(
+            self.dir, "views", hashlib.blake2b(digests.tobytes(), digest_size=16).hexdigest() + ".npy"
+        )
+        if not os.path.exists(view):
+            tmp = f"{view}.{uuid.uuid4().hex}.tmp"
+            out = np.lib.format.open_memmap(tmp, mode="w+", dtype=self.dtype, shape=(len(texts), dim))
+            self._gather(shards, rows, out, chunk_rows).flush()
+            del out
+            os.replace(tmp, view)
+        os.utime(view)
+        self._evict_views(view)
+        return np.load(view, mmap_mode="r")
+
+    def clear_views(self):
+        for path in glob.glob(os.path.join(self.dir, "views", "*.npy")):
+            os.remove(path)
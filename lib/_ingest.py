@@ -0,0 +1,197 @@
+import gzip, json, os
+from datetime import datetime, timedelta, timezone
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DROP_FIELDS = ("_id", "__v", "created_at")
+
+# Mirrors the mongoose post model in twitter-parse-v2 (minus the dropped fields)
+POST_SCHEMA = pa.schema([
+    ("tweet_id", pa.string()),
+    ("time", pa.string()),
+    ("author", pa.string()),
+    ("content", pa.string()),
+    ("comment_count", pa.int64()),
+    ("repost_count", pa.int64()),
+    ("like_count", pa.int64()),
+    ("view_count", pa.int64()),
+])
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _iso(dt: datetime) -> str:
+    # same text mongoexport writes for {"$date": ...}, minus the trailing Z
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat(timespec="milliseconds")
+
+
+def _unwrap(value):
+    if isinstance(value, datetime):
+        return _iso(value)
+    if isinstance(value, dict) and len(value) == 1:
+        if "$date" in value:
+            dt = value["$date"]
+            if isinstance(dt, dict):  # canonical {"$date": {"$numberLong": "..."}}
+                return _iso(_EPOCH + timedelta(milliseconds=int(dt["$numberLong"])))
+            return dt.rstrip("Z")
+        if "$numberLong" in value or "$numberInt" in value:
+            return int(next(iter(value.values())))
+        if "$numberDouble" in value:
+            return float(value["$numberDouble"])
+    return value
+
+
+def normalize_mongo_record(item: dict) -> dict:
+    """Record-level version of normalize_mongo_json from 1. dataset_prep."""
+    return {k: _unwrap(v) for k, v in item.items() if k not in DROP_FIELDS}
+
+
+def _open(path, mode):
+    return gzip.open(path, mode) if path.endswith(".gz") else open(path, mode)
+
+
+def _iter_json_array(fp, chunk_size=1 << 20):
+    # Decodes one element of a top-level JSON array at a time, holding at
+    # most a chunk (or one oversized record) of text in memory.
+    decoder = json.JSONDecoder()
+    buf, pos, eof, started = "", 0, False, False
+    while True:
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            more = fp.read(chunk_size)
+            buf, pos, eof = buf[pos:] + more, 0, not more
+        if pos >= len(buf):
+            raise ValueError("unexpected end of JSON array")
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("expected a JSON array")
+            started, pos = True, pos + 1
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            more = fp.read(chunk_size)
+            buf, pos, eof = buf[pos:] + more, 0, not more
+            continue
+        yield obj
+        pos = end
+        if pos > chunk_size:
+            buf, pos = buf[pos:], 0
+
+
+def iter_dump_records(path: str):
+    """
+    Streams raw records out of a mongodump / mongoexport file:
+    .bson (optionally .gz) through bson.decode_file_iter, JSONL, or a JSON
+    array as written by `mongoexport --jsonArray`.
+    """
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".bson"):
+        from bson import decode_file_iter
+        with _open(path, "rb") as fp:
+            yield from decode_file_iter(fp)
+        return
+    with _open(path, "rt") as fp:
+        head = fp.read(1)
+        while head and head.isspace():
+            head = fp.read(1)
+        if head == "[":
+            yield from _iter_json_array(_Prepend(head, fp))
+            return
+        first = head + fp.readline()
+        if first.strip():
+            yield json.loads(first)
+        for line in fp:
+            if line.strip():
+                yield json.loads(line)
+
+
+class _Prepend:
+    # puts back the character peeked while sniffing the file format
+    def __init__(self, head, fp):
+        self.head, self.fp = head, fp
+
+    def read(self, size):
+        head, self.head = self.head, ""
+        return head + self.fp.read(size - len(head))
+
+
+def coerce_record(row: dict, schema: pa.Schema) -> dict:
+    """`row` restricted to the fields of `schema`, integral floats cast to int."""
+    out = {}
+    for field in schema:
+        value = row.get(field.name)
+        if pa.types.is_integer(field.type) and isinstance(value, float) and value.is_integer():
+            value = int(value)
+        out[field.name] = value
+    return out
+
+
+def ingest_dump(
+    path: str,
+    out_dir: str,
+    prefix: str = None,
+    batch_size: int = 50_000,
+    rows_per_shard: int = 1_000_000,
+    schema: pa.Schema = POST_SCHEMA,
+) -> list:
+    """
+    Streams a dump into Parquet shards without ever holding the whole dump:
+    records are normalized one by one, written as a row group every
+    `batch_size` rows, and a new shard is started every `rows_per_shard`.
+    Load the result with Dataset.from_parquet(shard_paths).
+
+    Args:
+        path: .bson / .bson.gz / .jsonl / .json dump of the posts collection.
+        out_dir: Directory that receives <prefix>-00000.parquet, ...
+        prefix: Shard name prefix, defaults to the dump's file name.
+        batch_size: Rows buffered before they are flushed as one row group.
+        rows_per_shard: Rows per Parquet file.
+        schema: Output schema; fields missing from a record become null and
+            fields not in the schema are dropped. None infers it from the
+            first batch.
+    Returns:
+        The list of shard paths written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if prefix is None:
+        prefix = os.path.basename(path).split(".")[0]
+    shards, rows, writer = [], [], None
+    in_shard = total = 0
+
+    def flush():
+        nonlocal writer, schema, in_shard
+        if not rows:
+            return
+        if schema is None:
+            schema = pa.Table.from_pylist(rows).schema
+        table = pa.Table.from_pylist([coerce_record(row, schema) for row in rows], schema=schema)
+        if writer is None:
+            shards.append(os.path.join(out_dir, f"{prefix}-{len(shards):05d}.parquet"))
+            writer = pq.ParquetWriter(shards[-1], schema)
+        writer.write_table(table)
+        in_shard += len(rows)
+        rows.clear()
+        if in_shard >= rows_per_shard:
+            writer.close()
+            writer, in_shard = None, 0
+
+    for record in iter_dump_records(path):
+        rows.append(normalize_mongo_record(record))
+        total += 1
+        if len(rows) >= min(batch_size, rows_per_shard - in_shard):
+            flush()
+    flush()
+    if writer is not None:
+        writer.close()
+    print(f"Ingested {total:,} records from {path} into {len(shards)} shard(s)")
+    return shards
@@ -0,0 +1,217 @@
+import asyncio, hashlib, json, os, random, time
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import ValidationError
+
+
+def _strip_fences(content: str) -> str:
+    # both labeling scripts saw llama3 / qwen wrap the object in ```json
+    if "```" in content:
+        content = content.replace("```json", "").replace("```", "")
+    return content.strip()
+
+
+class LabelingRunner:
+    """
+    Concurrent, resumable LLM labeling against an Ollama server.
+
+    A bounded pool of `concurrency` async workers shares one ollama
+    AsyncClient. Every reply is validated against `schema` (the pydantic
+    TweetLabel of 4. / 8.); malformed JSON and transport errors are retried
+    with exponential backoff, and a row only counts as failed after
+    `max_retries` attempts. Each validated label is appended to the
+    `checkpoint` JSONL as soon as it arrives, keyed on a hash of model,
+    prompt and text, so an interrupted run picks up where it stopped and
+    identical tweets are only sent once. The system prompt is sent
+    unchanged on every request and the model is kept loaded
+    (`keep_alive`), which lets Ollama reuse the prompt prefix instead of
+    re-evaluating it for each tweet.
+
+        runner = LabelingRunner("llama3:8b", SYSTEM_PROMPT, TweetLabel,
+                                columns={"is_related_to_ruu_tni": "relevant"})
+        ds = ds.map(runner, batched=True, batch_size=5_000)
+        print(runner.stats())
+    """
+
+    def __init__(
+        self,
+        model: str,
+        system_prompt: str,
+        schema,
+        template: str = "{text}",
+        columns: dict = None,
+        defaults: dict = None,
+        column: str = "content",
+        checkpoint: str = "cache/labels.jsonl",
+        host: str = None,
+        concurrency: int = 8,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        options: dict = None,
+        keep_alive: str = "30m",
+        log_every: int = 500,
+    ):
+        if max_retries < 1:
+            raise Exception("max_retries must be at least 1")
+        self.model = model
+        self.system_prompt = system_prompt
+        self.schema = schema
+        self.template = template
+        self.columns = columns or {name: name for name in schema.model_fields}
+        self.defaults = defaults or {}
+        self.column = column
+        self.checkpoint = checkpoint
+        self.host = host
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.options = options
+        self.keep_alive = keep_alive
+        self.log_every = log_every
+        self._prefix = hashlib.blake2b(
+            f"{model}\0{system_prompt}\0{template}".encode(), digest_size=16
+        ).digest()
+        self._done = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.requests = self.labeled = self.resumed = self.retries = self.failed = 0
+        self.latencies = []
+        self.elapsed = 0.0
+        self._started = None
+
+    def __getstate__(self):
+        # keep datasets' fingerprinting / worker pickling cheap; the labels
+        # are reloaded from the checkpoint on the other side
+        state = self.__dict__.copy()
+        state["_done"] = None
+        return state
+
+    def key(self, text: str) -> str:
+        return hashlib.blake2b(self._prefix + text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+    def _load(self):
+        if self._done is None:
+            self._done = {}
+            if os.path.exists(self.checkpoint):
+                with open(self.checkpoint) as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue  # torn last line from a killed run
+                        self._done[entry["key"]] = entry["label"]
+        return self._done
+
+    async def _label_one(self, client, text: str):
+        for attempt in range(self.max_retries):
+            if attempt:
+                self.retries += 1
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * (0.5 + random.random()))
+            start = time.perf_counter()
+            self.requests += 1
+            try:
+                response = await client.chat(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": self.system_prompt},
+                        {"role": "user", "content": self.template.format(text=text)},
+                    ],
+                    format="json",
+                    options=self.options,
+                    keep_alive=self.keep_alive,
+                )
+                label = self.schema.model_validate_json(_strip_fences(response["message"]["content"]))
+            except ValidationError as e:
+                error = f"malformed JSON: {e.errors()[0]['msg']}"
+                continue
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                continue
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+            return label.model_dump()
+        print(f"Giving up after {self.max_retries} attempts ({error}): {text[:60]!r}")
+        return None
+
+    async def arun(self, texts: list[str]) -> list:
+        """Labels `texts`, returning one label dict (or None on failure) per text."""
+        import ollama
+        done = self._load()
+        keys = [self.key(text) for text in texts]
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key in done:
+                self.resumed += 1
+            elif key not in pending:
+                pending[key] = text
+        queue = asyncio.Queue()
+        for item in pending.items():
+            queue.put_nowait(item)
+
+        if os.path.dirname(self.checkpoint):
+            os.makedirs(os.path.dirname(self.checkpoint), exist_ok=True)
+        client = ollama.AsyncClient(host=self.host)
+        self._started = time.perf_counter()
+        with open(self.checkpoint, "a") as out:
+
+            async def worker():
+                while not queue.empty():
+                    key, text = queue.get_nowait()
+                    label = await self._label_one(client, text)
+                    if label is None:
+                        self.failed += 1
+                        continue
+                    done[key] = label
+                    out.write(json.dumps({"key": key, "label": label}) + "\n")
+                    out.flush()
+                    self.labeled += 1
+                    if self.log_every and self.labeled % self.log_every == 0:
+                        print(self._progress())
+
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(pending)))))
+        self.elapsed += time.perf_counter() - self._started
+        self._started = None
+        return [done.get(key) for key in keys]
+
+    def run(self, texts: list[str]) -> list:
+        """
+        Synchronous arun(). Inside an already running event loop (Jupyter)
+        asyncio.run is not allowed, so the labeling loop gets its own thread;
+        from async code, `await runner.arun(texts)` directly instead.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.arun(texts))
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, self.arun(texts)).result()
+
+    def __call__(self, batch):
+        labels = self.run(batch[self.column])
+        for field, column in self.columns.items():
+            batch[column] = [
+                label[field] if label is not None else self.defaults.get(column)
+                for label in labels
+            ]
+        return batch
+
+    def _progress(self):
+        s = self.stats()
+        return (f"labeled {s['labeled']:,} ({s['rows_per_sec']:.1f} rows/s, "
+                f"p50 {s['latency_p50']:.2f}s, retries {s['retries']:,}, failed {s['failed']:,})")
+
+    def stats(self) -> dict:
+        """Throughput and latency counters since construction / reset_stats()."""
+        elapsed = self.elapsed + (time.perf_counter() - self._started if self._started else 0.0)
+        lat = sorted(self.latencies)
+        pct = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] if lat else 0.0
+        return {
+            "requests": self.requests,
+            "labeled": self.labeled,
+            "resumed": self.resumed,
+            "retries": self.retries,
+            "failed": self.failed,
+            "rows_per_sec": self.labeled / elapsed if elapsed else 0.0,
+            "latency_p50": pct(0.5),
+            "latency_p95": pct(0.95),
+        }
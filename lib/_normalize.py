@@ -0,0 +1,237 @@
+import hashlib, inspect, re, unicodedata
+import jaconv, emoji
+from _cleaner import (
+    _URL, _MENTION, _REPEAT, _WS, _KUTI_CUT,
+    _DARI_URL_ATTACHED, _DARI_URL_SPACED, _DARI_STUCK, _DOMAIN_ONLY,
+)
+
+# --- STAGES ---
+# Every stage is str -> str. The bodies are the steps of the per-notebook
+# cleantext copies and of clean_twitter_text, one step (or one fixed run of
+# steps) each, so a profile is just an ordered tuple of stage names.
+_RT         = re.compile(r'^rt\s+', re.I)
+_YEAR_GLUED = re.compile(r'(\b\d{4})(?=[a-zA-Z])')
+_NB_URL     = re.compile(r'http\S+|www\S+')
+_NB_MENTION = re.compile(r'rt @\S+|@\S+')
+_NB_HASHTAG = re.compile(r'#(\S+)')
+_NB_REPEAT  = re.compile(r'(\w)\1{2,}')
+
+_emoji_to_words = None
+
+
+def _nfkc(text):
+    return unicodedata.normalize('NFKC', text)
+
+
+def _zenkaku(text):
+    return jaconv.z2h(text, kana=False, digit=True, ascii=True)
+
+
+def _grok(text):
+    text = text.replace("tanya grok", " ")
+    text = text.replace("grokproductivitypasang", " ")
+    return text.replace('\\n', ' ').replace('\\r', ' ')
+
+
+def _url(text):
+    return _URL.sub(' <url> ', text)
+
+
+def _unavailable(text):
+    # the notebook cleantext ("indobertweet")
+    return text.replace('ini tidak tersedia', ' ')
+
+
+def _url_unavailable(text):
+    # lib/_cleaner.clean_twitter_text
+    return text.replace('<url> ini tidak tersedia', ' ')
+
+
+def _mention(text):
+    return _MENTION.sub('@USER', text)
+
+
+def _retweet(text):
+    return _RT.sub('', text)
+
+
+def _year(text):
+    return _YEAR_GLUED.sub(r'\1 ', text)
+
+
+def _kutipan(text):
+    return _KUTI_CUT.sub('', text)
+
+
+def _dari(text):
+    # --- RULE ORDER IS IMPORTANT --- (see clean_twitter_text)
+    text = _DARI_URL_ATTACHED.sub(r'\1', text)
+    text = _DARI_URL_SPACED.sub('', text)
+    return _DARI_STUCK.sub(r'\1', text)
+
+
+def _domain(text):
+    return _DOMAIN_ONLY.sub(' ', text)
+
+
+def _demojize(text):
+    return emoji.demojize(text, delimiters=(' ', ' '))
+
+
+def _repeat(text):
+    return _REPEAT.sub(r'\1', text)
+
+
+def _whitespace(text):
+    return _WS.sub(' ', text).strip()
+
+
+def _lower(text):
+    return text.lower()
+
+
+def _nusabert_markup(text):
+    # 10. clustering_analysis clean_tweet_for_nusabert, steps 2-4
+    text = _NB_URL.sub('', text)
+    text = _NB_MENTION.sub('', text)
+    return _NB_HASHTAG.sub(r'\1', text)
+
+
+def _emoji_words(text):
+    global _emoji_to_words
+    if _emoji_to_words is None:
+        from indoNLP.preprocessing import emoji_to_words
+        _emoji_to_words = emoji_to_words
+    return _emoji_to_words(text)
+
+
+def _nusabert_repeat(text):
+    return _NB_REPEAT.sub(r'\1', text)
+
+
+STAGES = {
+    "nfkc": _nfkc,
+    "zenkaku": _zenkaku,
+    "grok": _grok,
+    "url": _url,
+    "unavailable": _unavailable,
+    "url_unavailable": _url_unavailable,
+    "mention": _mention,
+    "retweet": _retweet,
+    "year": _year,
+    "kutipan": _kutipan,
+    "dari": _dari,
+    "domain": _domain,
+    "demojize": _demojize,
+    "repeat": _repeat,
+    "whitespace": _whitespace,
+    "lower": _lower,
+    "nusabert_markup": _nusabert_markup,
+    "emoji_words": _emoji_words,
+    "nusabert_repeat": _nusabert_repeat,
+}
+
+_INDOBERTWEET = (
+    "nfkc", "zenkaku", "grok", "url", "unavailable", "mention",
+    "retweet", "year", "kutipan", "whitespace",
+)
+_NUSABERT = ("lower", "nusabert_markup", "emoji_words", "nusabert_repeat", "whitespace")
+PROFILES = {
+    # the notebook cleantext; classifier input
+    "indobertweet": _INDOBERTWEET,
+    # cleantext followed by clean_tweet_for_nusabert (10. clustering_analysis)
+    "nusabert": _INDOBERTWEET + _NUSABERT,
+    # clean_tweet_for_nusabert on its own: raw text in 2., text that
+    # already went through cleantext in 10.
+    "nusabert_only": _NUSABERT,
+    # lib/_cleaner.clean_twitter_text: lowercased, demojized, domains dropped
+    "llm": (
+        "nfkc", "zenkaku", "grok", "url", "url_unavailable", "mention",
+        "retweet", "year", "kutipan", "dari", "domain", "demojize",
+        "repeat", "whitespace", "lower",
+    ),
+}
+
+
+def profile_version(profile: str) -> str:
+    """
+    Fingerprint of a profile: its stage order plus the source of every stage
+    and the compiled rules they use. Changes whenever the profile's output
+    could change, so it can be stored next to cleaned columns or cache keys.
+    """
+    h = hashlib.blake2b(digest_size=8)
+    for name in PROFILES[profile]:
+        fn = STAGES[name]
+        h.update(name.encode())
+        h.update(inspect.getsource(fn).encode())
+        for ref in fn.__code__.co_names:
+            value = fn.__globals__.get(ref)
+            if isinstance(value, re.Pattern):
+                h.update(f"{value.pattern!r}/{value.flags}".encode())
+    h.update(getattr(jaconv, "__version__", "?").encode())
+    h.update(getattr(emoji, "__version__", "?").encode())
+    h.update(unicodedata.unidata_version.encode())
+    return h.hexdigest()
+
+
+def _build_tree(profiles):
+    # Stage-name trie: profiles that start with the same stages walk the
+    # same branch, so the shared prefix runs once per row.
+    root = {}
+    for profile in profiles:
+        node = root
+        for name in PROFILES[profile]:
+            node = node.setdefault(name, {})
+        node.setdefault(None, []).append(profile)
+    return root
+
+
+class TextNormalizer:
+    """
+    Runs one or more named profiles over the text in a single pass.
+
+    Shared prefix stages are evaluated once per row and every profile lands
+    in its own column, e.g.
+        ds.map(TextNormalizer(["indobertweet", "nusabert"]), batched=True)
+    adds content_indobertweet and content_nusabert. Pass `columns` to pick
+    the output names (mapping a profile back onto "content" is allowed).
+    """
+
+    def __init__(self, profiles=("indobertweet",), column: str = "content", columns=None):
+        if isinstance(profiles, str):
+            profiles = (profiles,)
+        for profile in profiles:
+            if profile not in PROFILES:
+                raise Exception(f"profile must be one of {', '.join(PROFILES)}")
+        self.profiles = tuple(profiles)
+        self.column = column
+        self.columns = {profile: f"{column}_{profile}" for profile in self.profiles}
+        self.columns.update(columns or {})
+        self.versions = {profile: profile_version(profile) for profile in self.profiles}
+        self._tree = _build_tree(self.profiles)
+
+    def _walk(self, node, text, out):
+        for name, child in node.items():
+            if name is None:
+                for profile in child:
+                    out[profile] = text
+            else:
+                self._walk(child, STAGES[name](text), out)
+
+    def normalize(self, text: str) -> dict:
+        out = {}
+        self._walk(self._tree, text, out)
+        return out
+
+    def normalize_batch(self, texts: list[str]) -> dict:
+        out = {profile: [] for profile in self.profiles}
+        for text in texts:
+            row = self.normalize(text)
+            for profile in self.profiles:
+                out[profile].append(row[profile])
+        return out
+
+    def __call__(self, batch):
+        for profile, values in self.normalize_batch(batch[self.column]).items():
+            batch[self.columns[profile]] = values
+        return batch
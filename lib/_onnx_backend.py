@@ -0,0 +1,210 @@
+import json, os, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+import numpy as np
+from _activations import softmax
+
+# what each exported graph returns
+KINDS = ("sequence-classification", "sentence-embedding")
+
+
+def _wrap(model, kind):
+    import torch
+
+    class Wrapped(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids=None):
+            features = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if token_type_ids is not None:
+                features["token_type_ids"] = token_type_ids
+            if kind == "sentence-embedding":
+                # SentenceTransformer modules: transformer + pooling (+ normalize)
+                return self.model(features)["sentence_embedding"]
+            return self.model(**features).logits
+
+    return Wrapped().eval()
+
+
+def _load_torch(source, kind, cache_dir):
+    if kind == "sentence-embedding":
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(source, cache_folder=cache_dir, device="cpu")
+        return model, model.tokenizer
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    model = AutoModelForSequenceClassification.from_pretrained(source, cache_dir=cache_dir)
+    return model, AutoTokenizer.from_pretrained(source, cache_dir=cache_dir)
+
+
+def export_onnx(
+    source: str,
+    out_dir: str,
+    kind: str = "sequence-classification",
+    max_length: int = 128,
+    quantize: bool = True,
+    opset: int = 17,
+    cache_dir: str = "cache/",
+) -> str:
+    """
+    Exports a Hub checkpoint to ONNX for CPU inference.
+
+    Writes model.onnx (fp32), model.int8.onnx (dynamic int8 quantization of
+    the MatMul/Gemm weights) when `quantize` is set, the tokenizer, and a
+    meta.json recording the source so parity_check can reload the original.
+    Batch and sequence length stay dynamic.
+
+    Args:
+        source: e.g. "tianharjuno/ruu-tni-relevancy-classification-p1",
+            "tianharjuno/ruu-tni-sentiment-classification" or, with
+            kind="sentence-embedding", "LazarusNLP/all-nusabert-large-v4".
+        kind: One of KINDS.
+    Returns:
+        out_dir
+    """
+    if kind not in KINDS:
+        raise Exception(f"kind must be one of {', '.join(KINDS)}")
+    import torch
+    os.makedirs(out_dir, exist_ok=True)
+    model, tokenizer = _load_torch(source, kind, cache_dir)
+    wrapped = _wrap(model, kind)
+    dummy = tokenizer(["contoh"], padding="max_length", max_length=16, truncation=True, return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in dummy]
+    axes = {n: {0: "batch", 1: "sequence"} for n in names}
+    axes["output"] = {0: "batch"}
+    fp32 = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapped, tuple(dummy[n] for n in names), fp32,
+            input_names=names, output_names=["output"], dynamic_axes=axes,
+            opset_version=opset, dynamo=False,
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32, os.path.join(out_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"source": source, "kind": kind, "max_length": max_length}, f, indent=2)
+    print(f"Exported {source} to {out_dir}")
+    return out_dir
+
+
+class OnnxModel:
+    """
+    Thread-pooled onnxruntime inference for a model written by export_onnx.
+
+    One InferenceSession is shared by `workers` threads (run() is thread
+    safe). Batches are tokenized in the calling thread, since a fast
+    tokenizer must not be used from several threads at once, while the
+    pool runs the session on the previous ones; at most 2 * workers
+    batches are in flight. Each batch is padded only
+    to its own longest row and uses
+    `threads` intra-op threads, so workers * threads should roughly match
+    the cores of the node. predict() returns logits (classification) or
+    sentence embeddings; rows_per_sec holds the throughput of the last call.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        quantized: bool = True,
+        workers: int = None,
+        threads: int = None,
+        batch_size: int = 32,
+        max_length: int = None,
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        with open(os.path.join(model_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.kind = self.meta["kind"]
+        self.max_length = max_length or self.meta["max_length"]
+        cores = os.cpu_count() or 1
+        self.workers = workers or max(1, cores // 4)
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or max(1, cores // self.workers)
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        path = os.path.join(model_dir, "model.int8.onnx" if quantized else "model.onnx")
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.batch_size = batch_size
+        self.rows_per_sec = 0.0
+
+    def _feed(self, texts):
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        return {name: encoded[name].astype(np.int64) for name in self.input_names}
+
+    def _run(self, feed):
+        return self.session.run(None, feed)[0]
+
+    def predict(self, texts: list[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.session.get_outputs()[0].shape[-1]), dtype=np.float32)
+        starts = range(0, len(texts), self.batch_size)
+        results, pending = [None] * len(starts), {}
+        start = time.perf_counter()
+        # tokenize in this thread but keep only about two batches per worker
+        # queued, collecting them as they finish, so the encoded feeds of
+        # the whole input never sit in memory at once
+        with ThreadPoolExecutor(self.workers) as pool:
+            for i, first in enumerate(starts):
+                if len(pending) >= 2 * self.workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[pending.pop(future)] = future.result()
+                pending[pool.submit(self._run, self._feed(texts[first:first + self.batch_size]))] = i
+            for future in as_completed(pending):
+                results[pending[future]] = future.result()
+        out = np.concatenate(results)
+        self.rows_per_sec = len(texts) / (time.perf_counter() - start)
+        return out
+
+    def predict_proba(self, texts: list[str]) -> np.ndarray:
+        return softmax(self.predict(texts))
+
+
+def parity_check(onnx_model: OnnxModel, texts: list[str], labels=None, batch_size: int = 32, cache_dir: str = "cache/") -> dict:
+    """
+    Compares an OnnxModel against the PyTorch checkpoint it came from on
+    CPU, e.g. over the cleaned `test` / `test_sentiment` splits:
+        parity_check(model, relevancy_test["content"], relevancy_test["label"])
+    Classification reports argmax agreement, the largest probability gap
+    and (given labels) accuracy of both; embeddings report cosine
+    similarity. Both report rows/sec.
+    """
+    import torch
+    texts = list(texts)
+    model, tokenizer = _load_torch(onnx_model.meta["source"], onnx_model.kind, cache_dir)
+    wrapped = _wrap(model, onnx_model.kind)
+    start = time.perf_counter()
+    outputs = []
+    with torch.no_grad():
+        for i in range(0, len(texts), batch_size):
+            encoded = tokenizer(texts[i:i + batch_size], padding=True, truncation=True,
+                                max_length=onnx_model.max_length, return_tensors="pt")
+            outputs.append(wrapped(**{n: encoded[n] for n in onnx_model.input_names}).numpy())
+    reference = np.concatenate(outputs)
+    torch_rps = len(texts) / (time.perf_counter() - start)
+    result = onnx_model.predict(texts)
+    report = {"rows": len(texts), "torch_rows_per_sec": torch_rps, "onnx_rows_per_sec": onnx_model.rows_per_sec}
+    if onnx_model.kind == "sentence-embedding":
+        cos = (reference * result).sum(axis=1) / (
+            np.linalg.norm(reference, axis=1) * np.linalg.norm(result, axis=1)
+        )
+        report.update(cosine_mean=float(cos.mean()), cosine_min=float(cos.min()))
+    else:
+        ref_pred, onnx_pred = reference.argmax(axis=1), result.argmax(axis=1)
+        report.update(
+            agreement=float((ref_pred == onnx_pred).mean()),
+            max_prob_diff=float(np.abs(softmax(reference) - softmax(result)).max()),
+        )
+        if labels is not None:
+            labels = np.asarray(labels)
+            report.update(
+                torch_accuracy=float((ref_pred == labels).mean()),
+                onnx_accuracy=float((onnx_pred == labels).mean()),
+            )
+    print(", ".join(f"{k}: {v:.4f}" if isinstance(v, float) else f"{k}: {v}" for k, v in report.items()))
+    return report
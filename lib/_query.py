@@ -0,0 +1,110 @@
+import datetime
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from _arrow import table_and_indices
+
+
+def _scalar(value, type_):
+    if isinstance(value, pa.Scalar):
+        return value
+    if isinstance(value, str) and pa.types.is_temporal(type_):
+        # naive ISO bounds are read as UTC, like the stored post times
+        value = datetime.datetime.fromisoformat(value)
+    return pa.scalar(value).cast(type_)
+
+
+def eq(column: str, value):
+    """Rows where `column` equals `value`."""
+    return lambda table: pc.equal(table.column(column), _scalar(value, table.schema.field(column).type))
+
+
+def ne(column: str, value):
+    """Rows where `column` is set and differs from `value`."""
+    return lambda table: pc.not_equal(table.column(column), _scalar(value, table.schema.field(column).type))
+
+
+def isin(column: str, values):
+    """Rows whose `column` is one of `values` (any iterable, e.g. a set of ids)."""
+    def predicate(table):
+        type_ = table.schema.field(column).type
+        return pc.is_in(table.column(column), value_set=pa.array(list(values), type=type_))
+    return predicate
+
+
+def not_in(column: str, values):
+    """Rows whose `column` is none of `values`."""
+    inner = isin(column, values)
+    return lambda table: pc.invert(inner(table))
+
+
+def between(column: str, start=None, end=None):
+    """
+    Rows with start <= column < end (either bound optional). Works on
+    timestamp / date columns and on the ISO strings of the post schema,
+    which compare correctly as text: between("time", "2024-08-21", "2024-09-21").
+    """
+    def predicate(table):
+        values = table.column(column)
+        type_ = table.schema.field(column).type
+        masks = []
+        if start is not None:
+            masks.append(pc.greater_equal(values, _scalar(start, type_)))
+        if end is not None:
+            masks.append(pc.less(values, _scalar(end, type_)))
+        return _all(masks, table.num_rows)
+    return predicate
+
+
+def _all(masks, num_rows):
+    if not masks:
+        return pa.array(np.ones(num_rows, dtype=bool))
+    mask = pc.fill_null(masks[0], False)
+    for current in masks[1:]:
+        mask = pc.and_(mask, pc.fill_null(current, False))
+    return mask
+
+
+def _mask(source, predicates):
+    table, indices = table_and_indices(source)
+    mask = _all([predicate(table) for predicate in predicates], table.num_rows)
+    if indices is not None:
+        mask = pc.take(mask, indices)
+    return mask
+
+
+def where(source, *predicates) -> np.ndarray:
+    """
+    Row positions of `source` (a Dataset, even one already select()-ed or
+    filter()-ed, or a pyarrow Table) where every predicate holds, computed
+    with vectorized Arrow kernels on just the referenced columns:
+        relevant_ds = ds.select(where(ds, eq("relevant", True)))
+        unseen = ds.select(where(ds, not_in("content", train_ids | test_ids)))
+    Dataset.select on the result only stores an indices mapping, so no
+    column is copied and no cache file is rewritten. Nulls never match.
+    """
+    mask = _mask(source, predicates)
+    return np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+
+
+def split_by(source, column: str, *predicates) -> dict:
+    """
+    Row positions grouped by the value of `column` in one pass (rows
+    failing a predicate, or null in `column`, are left out):
+        groups = split_by(relevant_ds, "sentiment")
+        negative = relevant_ds.select(groups[0])
+    """
+    table, indices = table_and_indices(source)
+    positions = where(source, *predicates)
+    values = table.column(column)
+    if indices is not None:
+        values = pc.take(values, indices)
+    values = pc.take(values, pa.array(positions))
+    valid = pc.is_valid(values).to_numpy(zero_copy_only=False)
+    positions, values = positions[valid], values.filter(pc.is_valid(values)).to_numpy(zero_copy_only=False)
+    order = np.argsort(values, kind="stable")
+    keys, starts = np.unique(values[order], return_index=True)
+    return {
+        key.item() if hasattr(key, "item") else key: positions[group]
+        for key, group in zip(keys, np.split(order, starts[1:]))
+    }
@@ -0,0 +1,177 @@
+import hashlib, os
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from _arrow import iter_batches
+
+SENTIMENT_COLUMNS = ("count_neg", "count_neu", "count_pos")
+
+
+def _id_digests(ids) -> np.ndarray:
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(str(i).encode(), digest_size=8).digest(), "little") for i in ids],
+        dtype=np.uint64,
+    )
+
+
+class SentimentRollup:
+    """
+    Materialized daily sentiment counts that grow incrementally.
+
+    The store is one small Parquet table with a row per UTC day and a
+    count per sentiment class (count_neg / count_neu / count_pos), plus a
+    sorted array of 8-byte digests of every tweet_id already counted, kept
+    in `path`. update() only aggregates the rows it is given and skips
+    tweets it has seen, so feeding it each new scored delta (or the whole
+    split again) never double counts:
+        rollup = SentimentRollup("cache/rollups/sentiment")
+        rollup.update(labeled_ds)
+        weekly_data = rollup.weekly(C=500, start="2023-01-01", end="2025-05-31")
+    A source without `id_column` is rejected rather than counted blindly;
+    pass id_column=None to opt out of deduplication, in which case every
+    update() adds all the rows it is given.
+    Weekly counts, ratios, net sentiment and the volume-weighted score are
+    derived from the daily counts with vectorized numpy on every call; they
+    never touch the corpus.
+    """
+
+    def __init__(
+        self,
+        path: str = "cache/rollups/sentiment",
+        time_column: str = "time",
+        sentiment_column: str = "sentiment",
+        relevant_column: str = "relevant",
+        id_column: str = "tweet_id",
+    ):
+        self.path = path
+        self.time_column = time_column
+        self.sentiment_column = sentiment_column
+        self.relevant_column = relevant_column
+        self.id_column = id_column
+        os.makedirs(path, exist_ok=True)
+        self._daily_path = os.path.join(path, "daily.parquet")
+        self._seen_path = os.path.join(path, "seen.npy")
+        self._days = np.empty(0, dtype=np.int32)
+        self._counts = np.zeros((0, len(SENTIMENT_COLUMNS)), dtype=np.int64)
+        if os.path.exists(self._daily_path):
+            daily = pq.read_table(self._daily_path)
+            self._days = daily.column("date").cast(pa.int32()).to_numpy()
+            self._counts = np.column_stack([daily.column(c).to_numpy() for c in SENTIMENT_COLUMNS])
+        self._seen = np.load(self._seen_path) if os.path.exists(self._seen_path) else np.empty(0, dtype=np.uint64)
+
+    def _days_of(self, column) -> np.ndarray:
+        # ISO strings (the post schema) or timestamps -> days since epoch (UTC)
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            column = pc.cast(pc.utf8_slice_codeunits(column, 0, 10), pa.date32())
+        elif not pa.types.is_date32(column.type):
+            column = pc.cast(column, pa.timestamp("ms")).cast(pa.date32())
+        return column.cast(pa.int32()).to_numpy(zero_copy_only=False)
+
+    def update(self, source, batch_rows: int = 262_144) -> int:
+        """
+        Adds the relevant, sentiment-labelled rows of `source` (a Dataset,
+        a pyarrow Table or Parquet path(s)) that were not counted before.
+        Returns the number of rows added. Nothing is recorded, in memory or
+        on disk, unless every batch of `source` is valid, so a failed
+        update() can simply be retried.
+        """
+        # new digests and counts stay local until the whole source passed
+        seen, added, days, classes = self._seen, 0, [], []
+        for batch in iter_batches(source, batch_rows):
+            names = batch.schema.names
+            if self.id_column and self.id_column not in names:
+                raise Exception(f"source has no {self.id_column} column; pass id_column=None to count rows without deduplication")
+            mask = pc.is_valid(batch.column(self.sentiment_column))
+            mask = pc.and_(mask, pc.is_valid(batch.column(self.time_column)))
+            if self.relevant_column in names:
+                mask = pc.and_(mask, pc.fill_null(batch.column(self.relevant_column), False))
+            batch = batch.filter(mask)
+            if not batch.num_rows:
+                continue
+            sentiment = batch.column(self.sentiment_column).to_numpy(zero_copy_only=False).astype(np.int64)
+            if sentiment.min() < 0 or sentiment.max() >= len(SENTIMENT_COLUMNS):
+                raise Exception(f"sentiment must be in 0..{len(SENTIMENT_COLUMNS) - 1}")
+            keep = np.ones(batch.num_rows, dtype=bool)
+            if self.id_column:
+                digest = _id_digests(batch.column(self.id_column).to_pylist())
+                position = np.searchsorted(seen, digest)
+                keep = seen[np.minimum(position, len(seen) - 1)] != digest if len(seen) else keep
+                # duplicates inside the batch itself count once
+                _, first = np.unique(digest, return_index=True)
+                unique = np.zeros(batch.num_rows, dtype=bool)
+                unique[first] = True
+                keep &= unique
+                seen = np.union1d(seen, digest[keep])
+            days.append(self._days_of(batch.column(self.time_column))[keep])
+            classes.append(sentiment[keep])
+            added += int(keep.sum())
+        if not added:
+            return 0
+        days, classes = np.concatenate(days), np.concatenate(classes)
+        all_days, inverse = np.unique(np.concatenate([self._days, days]), return_inverse=True)
+        counts = np.zeros((len(all_days), len(SENTIMENT_COLUMNS)), dtype=np.int64)
+        np.add.at(counts, inverse[:len(self._days)], self._counts)
+        np.add.at(counts, (inverse[len(self._days):], classes), 1)
+        self._days, self._counts, self._seen = all_days.astype(np.int32), counts, seen
+        self._save()
+        return added
+
+    def _save(self):
+        table = pa.table({
+            "date": pa.array(self._days, pa.int32()).cast(pa.date32()),
+            **{c: pa.array(self._counts[:, i]) for i, c in enumerate(SENTIMENT_COLUMNS)},
+        })
+        pq.write_table(table, self._daily_path + ".tmp")
+        os.replace(self._daily_path + ".tmp", self._daily_path)
+        with open(self._seen_path + ".tmp", "wb") as f:
+            np.save(f, self._seen)
+        os.replace(self._seen_path + ".tmp", self._seen_path)
+
+    @staticmethod
+    def _frame(days, counts, start, end):
+        import pandas as pd
+        index = pd.to_datetime(days.astype("datetime64[D]"))
+        frame = pd.DataFrame(counts, index=index, columns=list(SENTIMENT_COLUMNS))
+        frame["relevant"] = counts.sum(axis=1)
+        if start is not None:
+            frame = frame[frame.index >= pd.Timestamp(start)]
+        if end is not None:
+            frame = frame[frame.index <= pd.Timestamp(end)]
+        return frame
+
+    def daily(self, start=None, end=None):
+        """Counts per day (only days with relevant tweets), as a DataFrame."""
+        return self._frame(self._days, self._counts, start, end)
+
+    def daily_ratios(self, start=None, end=None):
+        """P(sentiment | day) as negative / neutral / positive, plus net_sentiment."""
+        frame = self.daily(start, end)
+        ratios = frame[list(SENTIMENT_COLUMNS)].div(frame["relevant"], axis=0)
+        ratios.columns = ["negative", "neutral", "positive"]
+        ratios["net_sentiment"] = ratios["positive"] - ratios["negative"]
+        return ratios
+
+    def weekly(self, C: float = 500, start=None, end=None):
+        """
+        Weekly counts with the derived series used by the plots:
+        sentiment_score = (pos - neg) / relevant, trust_factor =
+        relevant / (relevant + C) and weighted_sentiment. Weeks run Monday
+        to Sunday and are labelled by that Sunday, as resample('W') does;
+        empty weeks in between are zero.
+        """
+        if not len(self._days):
+            return self._frame(np.empty(0, dtype=np.int32), np.zeros((0, 3), dtype=np.int64), start, end)
+        weekday = (self._days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday; Monday = 0
+        labels = self._days + 6 - weekday
+        weeks = np.arange(labels.min(), labels.max() + 1, 7)
+        counts = np.zeros((len(weeks), len(SENTIMENT_COLUMNS)), dtype=np.int64)
+        np.add.at(counts, (labels - weeks[0]) // 7, self._counts)
+        frame = self._frame(weeks, counts, start, end)
+        relevant = frame["relevant"].to_numpy()
+        frame["sentiment_score"] = np.where(
+            relevant > 0, (frame["count_pos"] - frame["count_neg"]) / np.maximum(relevant, 1), 0.0
+        )
+        frame["trust_factor"] = relevant / (relevant + C)
+        frame["weighted_sentiment"] = frame["sentiment_score"] * frame["trust_factor"]
+        return frame
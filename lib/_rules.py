@@ -0,0 +1,143 @@
+import re
+
+# --- LAYERS 0-3 OF SYSTEM_PROMPT (4. llm_labeling.py) ---
+# Keep these in sync with the prompt; anything they don't decide is Layer 4
+# and still goes to the LLM.
+SPAM_KEYWORDS = (
+    "giveaway", "ga", "raffle", "jualan", "olshop", "jual", "wts", "jastip",
+    "promo", "diskon", "murah", "cek bio", "link di bio", "klik bio",
+    "linkonbio", "cek pinned", "kak", "join", "ikut", "ikutan",
+    "wish me luck", "wml", "bismillah win",
+)
+CORE_KEYWORDS = (
+    # core bill
+    "ruu tni", "revisi uu tni", "revisi uu 34 2004", "uu tni",
+    "ruu tentara nasional indonesia",
+    # core concepts
+    "dwifungsi abri", "dwifungsi tni", "jabatan sipil", "perluasan jabatan sipil",
+    "omsp", "operasi militer selain perang", "tni berpolitik",
+    "militer masuk politik", "peradilan militer", "impunitas",
+    "kemunduran reformasi", "ancaman demokrasi",
+    # key actors
+    "imparsial", "kontras", "komnas ham", "koalisi sipil", "koalisi masyarakat sipil",
+)
+PACKAGE_KEYWORDS = ("ruu polri", "revisi uu polri", "ruu kejaksaan", "polisi superbody")
+RELEVANT_HASHTAGS = (
+    "tolakruutni", "ruutni", "dwifungsiabri", "tolakdwifungsiabri",
+    "kembalikantnipromiliter", "saveourdemocracy", "tolakrevisiuutni",
+    "tolakuutni", "tolakruupolri", "indonesiagelap", "tolakruukejaksaan",
+)
+# Layer 0 words that are also everyday Indonesian ("ga" = nggak, "kak" as a
+# form of address). The prompt's own example "... militer jangan ikut
+# politik." is Layer 1, so rows whose only spam signal is one of these are
+# left to the LLM rather than forced to false.
+AMBIGUOUS_SPAM = ("ga", "kak", "join", "ikut", "ikutan")
+GENERAL_TNI_KEYWORDS = (
+    "dirgahayu tni", "hut tni", "tni hebat", "prajurit", "amankan perbatasan",
+    "tni bantu rakyat", "tni jaya selalu",
+)
+
+# (label, confidence) per decided layer, as the prompt assigns them
+LAYER_LABELS = {0: (False, 1.0), 1: (True, 1.0), 2: (True, 1.0), 3: (False, 1.0)}
+
+
+def _alternation(keywords):
+    # longest first so "ikutan" wins over "ikut"; any run of whitespace
+    # between the words of a phrase
+    return "|".join(
+        r"\s+".join(map(re.escape, kw.split()))
+        for kw in sorted(keywords, key=len, reverse=True)
+    )
+
+
+class RuleFilter:
+    """
+    Applies Layers 0-3 of the relevancy SYSTEM_PROMPT without the LLM.
+
+    One combined regex scans each tweet once; hashtags are matched as whole
+    tokens (so "#kontras" is not a Layer 1 text mention, but "#giveaway" is
+    still spam), and the layers found are then resolved in the prompt's
+    priority order. Rows no layer decides, or whose only spam hit is one
+    of AMBIGUOUS_SPAM, come back with layer None and
+    are the only ones worth sending to the LLM:
+        ds = ds.map(RuleFilter(), batched=True)
+    adds `relevant`, `confidence` and `layer`. Counters accumulate across
+    calls; summary() reports how much of the corpus was short-circuited.
+    """
+
+    def __init__(
+        self,
+        column: str = "content",
+        spam=SPAM_KEYWORDS,
+        ambiguous=AMBIGUOUS_SPAM,
+        core=CORE_KEYWORDS,
+        package=PACKAGE_KEYWORDS,
+        hashtags=RELEVANT_HASHTAGS,
+        general=GENERAL_TNI_KEYWORDS,
+    ):
+        self.column = column
+        strong = [kw for kw in spam if kw not in ambiguous]
+        self._spam_tags = {kw.replace(" ", "") for kw in strong}
+        self._hashtags = set(hashtags)
+        # zero-width, so a lower layer's phrase can't swallow the start of a
+        # higher one ("hut tni berpolitik" still finds "tni berpolitik")
+        self._pattern = re.compile(
+            r"(?=#(?P<tag>\w+)"
+            rf"|(?<![\w#])(?:(?P<l0>{_alternation(strong)})"
+            rf"|(?P<weak>{_alternation(ambiguous)})"
+            rf"|(?P<l1>{_alternation(core)})"
+            rf"|(?P<pkg>{_alternation(package)})"
+            rf"|(?P<l3>{_alternation(general)}))(?!\w))",
+            re.I,
+        )
+        self.counts = {layer: 0 for layer in (0, 1, 2, 3, None)}
+
+    def layer(self, text: str):
+        """Deciding layer (0-3) for one tweet, or None for Layer 4."""
+        found = set()
+        for m in self._pattern.finditer(text or ""):
+            kind = m.lastgroup
+            if kind == "tag":
+                tag = m.group("tag").lower()
+                if tag in self._spam_tags:
+                    return 0
+                if tag in self._hashtags:
+                    found.add("tag")
+            elif kind == "l0":
+                return 0
+            else:
+                found.add(kind)
+        if "weak" in found:
+            return None
+        if "l1" in found:
+            return 1
+        if "pkg" in found and "tag" in found:
+            return 2
+        if "l3" in found:
+            return 3
+        return None
+
+    def apply_batch(self, texts: list[str]) -> dict:
+        out = {"relevant": [], "confidence": [], "layer": []}
+        for text in texts:
+            layer = self.layer(text)
+            self.counts[layer] += 1
+            label, confidence = LAYER_LABELS.get(layer, (None, None))
+            out["relevant"].append(label)
+            out["confidence"].append(confidence)
+            out["layer"].append(layer)
+        return out
+
+    def __call__(self, batch):
+        batch.update(self.apply_batch(batch[self.column]))
+        return batch
+
+    def summary(self) -> dict:
+        total = sum(self.counts.values())
+        decided = total - self.counts[None]
+        share = decided / total if total else 0.0
+        print(f"Rules decided {decided:,} of {total:,} rows ({share:.1%}); "
+              + ", ".join(f"layer {k}: {v:,}" for k, v in self.counts.items() if k is not None)
+              + f", left for the LLM: {self.counts[None]:,}")
+        return {"total": total, "short_circuited": decided, "fraction": share,
+                "per_layer": dict(self.counts)}
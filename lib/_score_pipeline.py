@@ -0,0 +1,127 @@
+import os, time
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from _activations import softmax
+from _batch_predict import BatchPredictor
+from _arrow import iter_batches
+from _normalize import TextNormalizer
+
+SCORE_FIELDS = [
+    ("relevant", pa.bool_()),
+    ("relevance_prob", pa.float32()),
+    ("sentiment", pa.int8()),
+    ("sentiment_probs", pa.list_(pa.float32())),
+]
+
+
+def _load(model, cache_dir):
+    if isinstance(model, str):
+        from transformers import AutoModelForSequenceClassification
+        return AutoModelForSequenceClassification.from_pretrained(model, cache_dir=cache_dir)
+    return model
+
+
+class TwoStageScorer:
+    """
+    Relevancy -> sentiment scoring in one streaming pass.
+
+    Each chunk of rows is cleaned once (the "indobertweet" profile, i.e.
+    the cleantext both classifiers were trained on), tokenized once, and
+    run through the relevancy model; only rows predicted relevant are sent
+    on to the sentiment model, reusing the same token ids. Both stages go
+    through BatchPredictor, so batches are length-bucketed. Results are
+    appended to a Parquet file next to the original columns:
+        scorer = TwoStageScorer("tianharjuno/ruu-tni-relevancy-classification-p1",
+                                "tianharjuno/ruu-tni-sentiment-classification", device="cpu")
+        scorer.run(dataset["source_stage_1"], "out/scored.parquet")
+    Irrelevant rows get null sentiment / sentiment_probs. Both classifiers
+    are fine-tuned from IndoBERTweet, so they share one tokenizer; either
+    may also be an already loaded PyTorch model or an OnnxModel.
+    """
+
+    def __init__(
+        self,
+        relevancy,
+        sentiment,
+        tokenizer=None,
+        relevant_class: int = 1,
+        column: str = "content",
+        profile: str = "indobertweet",
+        max_tokens: int = 8192,
+        max_length: int = 128,
+        device=None,
+        cache_dir: str = "cache/",
+    ):
+        if tokenizer is None:
+            if hasattr(relevancy, "tokenizer"):
+                tokenizer = relevancy.tokenizer
+            else:
+                from transformers import AutoTokenizer
+                tokenizer = AutoTokenizer.from_pretrained(
+                    relevancy if isinstance(relevancy, str) else relevancy.name_or_path, cache_dir=cache_dir
+                )
+        kwargs = dict(max_tokens=max_tokens, max_length=max_length, device=device)
+        self.relevancy = BatchPredictor(_load(relevancy, cache_dir), tokenizer, **kwargs)
+        self.sentiment = BatchPredictor(_load(sentiment, cache_dir), tokenizer, **kwargs)
+        self.relevant_class = relevant_class
+        self.column = column
+        self.normalizer = TextNormalizer(profile, column=column, columns={profile: column}) if profile else None
+        self.profile = profile
+
+    def _clean(self, texts):
+        return self.normalizer.normalize_batch(texts)[self.profile] if self.normalizer is not None else texts
+
+    def score(self, texts: list[str]) -> dict:
+        """Score columns for raw texts."""
+        return self._score(self._clean(texts))
+
+    def _score(self, texts):
+        encoded = self.relevancy.encode(texts)
+        rel_probs = softmax(self.relevancy.predict_ids(encoded)) if encoded else np.empty((0, 2))
+        relevant = rel_probs.argmax(axis=1) == self.relevant_class if len(encoded) else np.zeros(0, dtype=bool)
+        keep = np.flatnonzero(relevant)
+        sentiment = [None] * len(texts)
+        sentiment_probs = [None] * len(texts)
+        if len(keep):
+            probs = softmax(self.sentiment.predict_ids([encoded[i] for i in keep]))
+            for i, p in zip(keep.tolist(), probs):
+                sentiment[i] = int(p.argmax())
+                sentiment_probs[i] = p.tolist()
+        return {
+            "relevant": relevant.tolist(),
+            "relevance_prob": rel_probs[:, self.relevant_class].tolist() if len(encoded) else [],
+            "sentiment": sentiment,
+            "sentiment_probs": sentiment_probs,
+        }
+
+    def run(self, source, out_path: str, batch_rows: int = 65_536) -> dict:
+        """
+        Streams `source` (Parquet path(s), a pyarrow Table or a Dataset)
+        into `out_path` with the score columns added (a cleaned `content`
+        replaces the raw one when a profile is set).
+        """
+        if os.path.dirname(out_path):
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        writer, total, forwarded = None, 0, 0
+        start = time.perf_counter()
+        for batch in iter_batches(source, batch_rows):
+            texts = self._clean(batch.column(self.column).to_pylist())
+            scores = self._score(texts)
+            table = pa.Table.from_batches([batch])
+            if self.normalizer is not None:
+                table = table.set_column(table.schema.get_field_index(self.column), self.column, pa.array(texts, pa.string()))
+            for name, type_ in SCORE_FIELDS:
+                if name in table.column_names:
+                    table = table.drop_columns([name])
+                table = table.append_column(pa.field(name, type_), pa.array(scores[name], type_))
+            if writer is None:
+                writer = pq.ParquetWriter(out_path, table.schema)
+            writer.write_table(table)
+            total += len(texts)
+            forwarded += sum(scores["relevant"])
+            print(f"Scored {total:,} rows, {forwarded:,} sent to sentiment "
+                  f"({total / (time.perf_counter() - start):.1f} rows/s)")
+        if writer is not None:
+            writer.close()
+        return {"rows": total, "relevant": forwarded, "rows_per_sec": total / (time.perf_counter() - start) if total else 0.0}
@@ -0,0 +1,120 @@
+import argparse, json, os
+from datetime import datetime, timezone
+import pyarrow as pa
+import pyarrow.parquet as pq
+from _ingest import POST_SCHEMA, normalize_mongo_record, coerce_record
+
+
+def _load_state(state_path):
+    if not os.path.exists(state_path):
+        return {"last_id": None, "max_time": None, "rows": 0, "shards": []}
+    with open(state_path) as f:
+        return json.load(f)
+
+
+def _save_state(state_path, state):
+    tmp = state_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, state_path)
+
+
+def sync_posts(
+    collection,
+    out_dir: str,
+    state_path: str = None,
+    prefix: str = "delta",
+    batch_size: int = 50_000,
+    schema: pa.Schema = POST_SCHEMA,
+):
+    """
+    Appends every post inserted since the last run as one new Parquet shard.
+
+    The high-water mark is the largest ObjectId seen so far: ObjectIds grow
+    with insertion time, unlike `time`, which the scraper fills in backwards
+    while scrolling. It lives in a small JSON state file next to the shards
+    and is only advanced after the shard is fully written, and a shard is
+    named after the mark it starts from, so a crashed run simply rewrites
+    the same shard next time.
+
+    Args:
+        collection: pymongo (or mongomock) collection holding the posts.
+        out_dir: Directory that receives the delta shards.
+        state_path: JSON file with the high-water mark, defaults to
+            <out_dir>/sync_state.json.
+        prefix: Shard name prefix.
+        batch_size: Rows per cursor batch and per Parquet row group.
+        schema: Output schema, see ingest_dump.
+    Returns:
+        Path of the new shard, or None when there was nothing new.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    state_path = state_path or os.path.join(out_dir, "sync_state.json")
+    state = _load_state(state_path)
+    query = {}
+    if state["last_id"] is not None:
+        from bson import ObjectId
+        query = {"_id": {"$gt": ObjectId(state["last_id"])}}
+    cursor = collection.find(query).sort("_id", 1).batch_size(batch_size)
+
+    shard = os.path.join(out_dir, f"{prefix}-{state['last_id'] or 'initial'}.parquet")
+    tmp = shard + ".tmp"
+    writer, rows, last_id, max_time, total = None, [], None, state["max_time"], 0
+
+    def flush():
+        nonlocal writer
+        if not rows:
+            return
+        if writer is None:
+            writer = pq.ParquetWriter(tmp, schema)
+        writer.write_table(pa.Table.from_pylist([coerce_record(row, schema) for row in rows], schema=schema))
+        rows.clear()
+
+    for record in cursor:
+        last_id = record["_id"]
+        row = normalize_mongo_record(record)
+        if row.get("time") and (max_time is None or row["time"] > max_time):
+            max_time = row["time"]
+        rows.append(row)
+        total += 1
+        if len(rows) >= batch_size:
+            flush()
+    flush()
+    if writer is None:
+        print(f"No new posts since {state['last_id']}")
+        return None
+    writer.close()
+    os.replace(tmp, shard)
+
+    state["last_id"] = str(last_id)
+    state["max_time"] = max_time
+    state["rows"] += total
+    if os.path.basename(shard) not in state["shards"]:
+        state["shards"].append(os.path.basename(shard))
+    state["synced_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    _save_state(state_path, state)
+    print(f"Synced {total:,} new posts into {shard} (high-water mark {state['last_id']})")
+    return shard
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append posts inserted since the last sync as a Parquet shard.")
+    parser.add_argument("--uri", default=None, help="defaults to the same local URI scripts/backup.sh uses")
+    parser.add_argument("--db", default="prod")
+    parser.add_argument("--collection", default="posts")
+    parser.add_argument("--out-dir", default="out/posts_delta")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    args = parser.parse_args()
+    uri = args.uri or "mongodb://{}:{}@localhost:27017".format(
+        os.environ.get("MONGODB_USERNAME", ""), os.environ.get("MONGODB_PASSWORD", "")
+    )
+    from pymongo import MongoClient
+    client = MongoClient(uri)
+    try:
+        sync_posts(client[args.db][args.collection], args.out_dir, batch_size=args.batch_size)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
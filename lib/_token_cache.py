@@ -0,0 +1,66 @@
+import hashlib, json, os
+import pyarrow as pa
+from _arrow import iter_batches
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """Name, Hub revision and a hash of the vocabulary of a tokenizer."""
+    h = hashlib.blake2b(digest_size=8)
+    h.update(str(tokenizer.name_or_path).encode())
+    h.update(str(tokenizer.init_kwargs.get("_commit_hash")).encode())
+    h.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode())
+    h.update(type(tokenizer).__name__.encode())
+    return h.hexdigest()
+
+
+def cached_tokenize(
+    dataset,
+    tokenizer,
+    column: str = "content",
+    max_length: int = 128,
+    padding="max_length",
+    cache_dir: str = "cache/tokenized",
+    batch_size: int = 10_000,
+):
+    """
+    Tokenizes a split once and reuses the result across runs.
+
+    The output is keyed on the split's datasets fingerprint, the tokenizer
+    (see tokenizer_fingerprint), the text column, max_length and padding,
+    and is written as one Arrow file with every original column plus
+    `input_ids` (uint16 when the vocabulary fits, else int32) and
+    `attention_mask` (int8). It is returned memory-mapped through
+    Dataset.from_file, so repeated training sweeps skip tokenization
+    entirely; set_format("torch") still hands the model int64 tensors.
+
+        encoded_train_ds = cached_tokenize(cleaned_train_ds, tokenizer, column="text")
+        encoded_train_ds.set_format("torch", columns=["label", "input_ids", "attention_mask"])
+    """
+    from datasets import Dataset, Features, Sequence, Value
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{dataset._fingerprint}|{tokenizer_fingerprint(tokenizer)}|{column}|{max_length}|{padding}".encode())
+    path = os.path.join(cache_dir, h.hexdigest() + ".arrow")
+    if os.path.exists(path):
+        return Dataset.from_file(path)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    id_type = "uint16" if len(tokenizer) <= 1 << 16 else "int32"
+    features = Features({
+        **{k: v for k, v in dataset.features.items() if k not in ("input_ids", "attention_mask")},
+        "input_ids": Sequence(Value(id_type)),
+        "attention_mask": Sequence(Value("int8")),
+    })
+    schema = features.arrow_schema
+    tmp = path + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_stream(sink, schema) as writer:
+        for batch in iter_batches(dataset, batch_size):
+            encoded = tokenizer(
+                batch.column(column).to_pylist(), truncation=True, max_length=max_length, padding=padding,
+            )
+            columns = {name: batch.column(name) for name in batch.schema.names if name in schema.names}
+            columns["input_ids"] = pa.array(encoded["input_ids"], schema.field("input_ids").type)
+            columns["attention_mask"] = pa.array(encoded["attention_mask"], schema.field("attention_mask").type)
+            writer.write_batch(pa.record_batch([columns[name] for name in schema.names], schema=schema))
+    os.replace(tmp, path)
+    print(f"Tokenized {len(dataset):,} rows into {path}")
+    return Dataset.from_file(path)
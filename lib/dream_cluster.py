@@ -0,0 +1,7 @@
+import os, sys
+
+# The model lives with the rest of the clustering code in
+# relevancy-classifier/pipelines; this keeps `from dream_cluster import
+# DreamCluster` working for anything that only has ../lib on its path.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "relevancy-classifier"))
+from pipelines.custom_pipeline import DreamCluster
@@ -121,43 +121,43 @@ You will now receive the user's tweet. Respond ONLY with the JSON object.
 # In[5]:
 
 
-def label_text(row):
-    text = row["content"]
-    try:
-        response = ollama.chat(
-            model="llama3:8b",
-            messages=[
-                {
-                    "role": "system",
-                    "content": SYSTEM_PROMPT
-                },
-                {
-                    "role": "user",
-                    "content": text
-                }
-            ],
-            format='json'  # <-- The correct argument for the ollama library
-        )
-        content_string = response['message']['content']
-        if content_string.startswith("```json"):
-            content_string = content_string[7:-3].strip()
-        label = TweetLabel.model_validate_json(content_string)
-        print(f"CONTENT: {text}")
-        print(f"RELEVANT: {label}")
-        print("====================================")
-        row["relevant"] = label.is_related_to_ruu_tni
-        return row
-    except ValidationError as e:
-        print(f"VALIDATION ERROR: LLM returned malformed JSON.\n{e}")
-
-    except Exception as e:
-        print(f"Error processing tweet: {e}\n")
+import sys
+sys.path.append("../lib")
+from _labeling import LabelingRunner
+from _rules import RuleFilter
+
+# Bounded async pool instead of one blocking ollama.chat per row; labels are
+# checkpointed as they arrive, so re-running this cell resumes a crashed run.
+llm = LabelingRunner(
+    "llama3:8b",
+    SYSTEM_PROMPT,
+    TweetLabel,
+    checkpoint="cache/relevancy_labels.jsonl",
+    concurrency=8,
+)
+# Layers 0-3 are keyword rules, so they are decided here; only Layer 4
+# leftovers pay for a generation.
+rules = RuleFilter()
+
+
+def label_text(batch):
+    batch = rules(batch)
+    todo = [i for i, layer in enumerate(batch["layer"]) if layer is None]
+    labels = llm.run([batch["content"][i] for i in todo])
+    for i, label in zip(todo, labels):
+        batch["layer"][i] = 4
+        if label is not None:
+            batch["relevant"][i] = label["is_related_to_ruu_tni"]
+            batch["confidence"][i] = label["confidence"]
+    return batch
 
 
 # In[ ]:
 
 
-ds_test = ds_test.map(label_text)
+ds_test = ds_test.map(label_text, batched=True, batch_size=5_000)
+rules.summary()
+print(llm.stats())
 
 
 # In[ ]:
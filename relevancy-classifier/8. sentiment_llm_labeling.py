@@ -1,8 +1,10 @@
 from datasets import load_dataset
 from huggingface_hub import whoami
 from huggingface_hub.utils import LocalTokenNotFoundError, HfHubHTTPError
-import ollama
-from pydantic import BaseModel, Field, ValidationError
+import sys
+from pydantic import BaseModel, Field
+sys.path.append("../lib")
+from _labeling import LabelingRunner
 try:
     # This hits the API to verify the token
     user_info = whoami()
@@ -110,46 +112,26 @@ Classify this text: "{input_text}"
 """
 
 
-def label_text(row):
-    text = row["content"]
-    # Initialize defaults to ensure data consistency on failure
-    row["sentiment"] = 1
-    try:
-        response = ollama.chat(
-            model="qwen2.5:7b-instruct",
-            messages=[
-                {"role": "system", "content": PROMPT},
-                {"role": "user", "content": f"Classify this text: \"{text}\""}
-            ],
-            format="json",
-            options={"temperature": 0.0}  # Deterministic outputs are better for labeling
-        )
-        content_string = response["message"]["content"]
-        if "```" in content_string:
-            content_string = content_string.replace("```json", "").replace("```", "").strip()
-
-        label_data = TweetLabel.model_validate_json(content_string)
-
-        # Save both label and reasoning
-        row["sentiment"] = label_data.label
-
-        print(f"LABEL: {label_data.label} | {text[:50]}...")
-        print(f"REASONING: {label_data.reasoning}")
-
-    except ValidationError as e:
-        print(f"JSON PARSE ERROR: {e}")
-        row["reasoning"] = f"JSON ERROR: {response['message']['content']}"
-    except Exception as e:
-        print(f"API ERROR: {e}")
-        row["reasoning"] = f"API ERROR: {str(e)}"
-
-    # ALWAYS return the row
-    return row
-
-sentiment_train_ds = sentiment_train_ds.map(label_text, num_proc=30)
+# Failed rows keep the neutral default (1), as before; every validated label
+# is checkpointed, so a crashed run resumes instead of starting over.
+label_text = LabelingRunner(
+    "qwen2.5:7b-instruct",
+    PROMPT,
+    TweetLabel,
+    template='Classify this text: "{text}"',
+    columns={"label": "sentiment"},
+    defaults={"sentiment": 1},
+    checkpoint="cache/sentiment_labels.jsonl",
+    concurrency=30,
+    options={"temperature": 0.0},  # Deterministic outputs are better for labeling
+)
+
+sentiment_train_ds = sentiment_train_ds.map(label_text, batched=True, batch_size=5_000)
+print(label_text.stats())
 dataset["train_sentiment"] = sentiment_train_ds
 dataset.push_to_hub("tianharjuno/twitter-parse", commit_message="labeled sentiment train ds")
 
-sentiment_test_ds = sentiment_test_ds.map(label_text, num_proc=56)
+sentiment_test_ds = sentiment_test_ds.map(label_text, batched=True, batch_size=5_000)
+print(label_text.stats())
 dataset["test_sentiment"] = sentiment_test_ds
 dataset.push_to_hub("tianharjuno/twitter-parse", commit_message="labeled sentiment test ds")
\ No newline at end of file
@@ -0,0 +1,24 @@
+import hashlib, json, os
+import numpy as np
+def embedding_fingerprint(data, block_rows=65_536):
+    # blake2b of shape, dtype and contents, fed in row blocks so a
+    # memory-mapped matrix (EmbeddingStore.get) is never copied whole
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{data.shape}|{data.dtype.str}".encode())
+    for start in range(0, len(data), block_rows):
+        h.update(np.ascontiguousarray(data[start:start + block_rows]).data)
+    return h.hexdigest()
+def cache_key(fingerprint, **params):
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.blake2b(f"{fingerprint}|{payload}".encode(), digest_size=16).hexdigest()
+def read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+def write_json(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(value, f)
+    os.replace(tmp, path)
@@ -0,0 +1,34 @@
+import os
+import joblib
+import numpy as np
+from ._cache import cache_key, embedding_fingerprint
+class ProjectionCache:
+    # UMAP outputs stored under root as <key>.npy (plus <key>.joblib for the
+    # fitted reducer), keyed on the input's fingerprint, the stage name and
+    # the UMAP parameters. project() returns the key as well, so a second
+    # stage can use it as its input fingerprint instead of rehashing.
+    # root=None disables the cache.
+    def __init__(self, root="cache/projections", keep_reducers=False):
+        self.root = root
+        self.keep_reducers = keep_reducers
+        if root:
+            os.makedirs(root, exist_ok=True)
+    def project(self, data, stage, params, build, fingerprint=None, need_reducer=False):
+        if not self.root:
+            reducer = build()
+            return reducer.fit_transform(data), reducer, None
+        key = cache_key(fingerprint or embedding_fingerprint(data), stage=stage, **params)
+        reduced_path = os.path.join(self.root, key + ".npy")
+        reducer_path = os.path.join(self.root, key + ".joblib")
+        if os.path.exists(reduced_path) and (not need_reducer or os.path.exists(reducer_path)):
+            print(f"Loaded cached {stage} projection {key}")
+            return np.load(reduced_path), joblib.load(reducer_path) if need_reducer else None, key
+        reducer = build()
+        reduced = reducer.fit_transform(data)
+        with open(reduced_path + ".tmp", "wb") as f:
+            np.save(f, reduced)
+        os.replace(reduced_path + ".tmp", reduced_path)
+        if need_reducer or self.keep_reducers:
+            joblib.dump(reducer, reducer_path + ".tmp")
+            os.replace(reducer_path + ".tmp", reducer_path)
+        return reduced, reducer, key
@@ -1,2 +1,2 @@
-from ._cluster import cluster_custom
-from ._sample import generate_ablation_sample
\ No newline at end of file
+from ._cluster import cluster_custom, DreamCluster
+from ._sample import generate_ablation_sample, ablation_indices, ablation_grid
\ No newline at end of file
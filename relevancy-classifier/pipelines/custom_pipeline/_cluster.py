@@ -1,15 +1,23 @@
+import os
+import joblib
 import numpy as np
-from hdbscan import HDBSCAN
+from hdbscan import HDBSCAN, approximate_predict
 from umap import UMAP
 from sklearn.neighbors import NearestNeighbors
-import skdim
 from skopt import gp_minimize
 from skopt.space import Integer
-from hdbscan.validity import validity_index
-def calculate_elbow_angle(k, data):
-    neighbors = NearestNeighbors(n_neighbors=k + 1, metric="euclidean").fit(data)
-    distances, _ = neighbors.kneighbors(data)
-    k_distances = np.sort(distances[:, -1])
+from ._knn import KNNGraph
+from ._search import search_hdbscan
+from ._intrinsic import estimate_intrinsic_dimension
+from .._cache import embedding_fingerprint
+from .._projection import ProjectionCache
+def calculate_elbow_angle(k, data, graph=None):
+    if graph is not None:
+        k_distances = np.sort(graph.kth_distances(k))
+    else:
+        neighbors = NearestNeighbors(n_neighbors=k + 1, metric="euclidean").fit(data)
+        distances, _ = neighbors.kneighbors(data)
+        k_distances = np.sort(distances[:, -1])
     n_points = len(k_distances)
     plateau_end = int(n_points * 0.8)
     cliff_start = int(n_points * 0.9)
@@ -21,134 +29,129 @@ def calculate_elbow_angle(k, data):
     m2, _ = np.polyfit(x_cliff.ravel(), y_cliff, 1)   
     sharpness = m2 - m1
     return -sharpness 
-def objective_for_hdbscan(params, data):
-    min_samples = max(2, int(params[0]))
-    min_cluster_size = max(2, int(params[1]))
-    clusterer = HDBSCAN(
-        min_samples=min_samples,
-        min_cluster_size=min_cluster_size,
-        metric="euclidean",
-        gen_min_span_tree=True,
-        allow_single_cluster=False,
-        core_dist_n_jobs=-1,
-        cluster_selection_method="eom"
-    )
-    clusterer.fit(data)
-    if clusterer.relative_validity_.size == 0:
-        return 0.0
-    return -np.sum(clusterer.relative_validity_)
-def objective_for_dbcv(params, data):
-    min_samples = max(2, int(params[0]))
-    min_cluster_size = max(2, int(params[1]))
-    if min_samples > min_cluster_size:
-        return 1.0 
-    clusterer = HDBSCAN(
-        min_samples=min_samples,
-        min_cluster_size=min_cluster_size,
-        metric="euclidean",
-        gen_min_span_tree=True, 
-        core_dist_n_jobs=-1,
-        cluster_selection_method="eom"
-    )
-    clusterer.fit(data)
-    labels = clusterer.labels_
-    non_noise_indices = np.where(labels != -1)[0]
-    unique_labels = np.unique(labels[non_noise_indices])
-    if len(unique_labels) < 2:
-        return 1.0 
-    non_noise_data = data[non_noise_indices]
-    non_noise_labels = labels[non_noise_indices]
-    try:
-        dbcv_score = validity_index(
-            non_noise_data, 
-            non_noise_labels, 
-            metric='euclidean',
-            verbose=True
-        )
-        return -dbcv_score  #type: ignore
-    except Exception as e:
-        return 1.0 
-def cluster_custom(raw_embeddings, seed=42, mode="stability"):
-    if mode.lower() not in ["heuristic", "stability", "mix", "dbcv"]:
-        raise Exception("mode must either be heuristic, stability, mix, or dbcv")
-    twonn = skdim.id.TwoNN()
-    intrinsic = int(np.clip(np.round(twonn.fit_transform(raw_embeddings)), 5, 50))
-    print(f"Found intrinsic dimension of {intrinsic} with TwoNN")
-    first_reductor = UMAP(n_neighbors=100, n_components=intrinsic, metric="cosine", random_state=seed, min_dist=0.0, n_jobs=-1)
-    second_reductor = UMAP(n_neighbors=20, n_components=10, metric="euclidean", random_state=seed, min_dist=0.0, n_jobs=-1)
-    print("Running first stage UMAP")
-    reduced_embedding = first_reductor.fit_transform(raw_embeddings)
-    print("Running second stage UMAP")
-    reduced_embedding = second_reductor.fit_transform(reduced_embedding)
-    print(f"Tuning HDBSCAN with mode: '{mode}'")
-    best_min_samples = 5  
-    best_min_cluster_size = 5 
-    if mode.lower() ==  "heuristic":
-        print("  -> Using 'heuristic' mode (Bayesian Optimization on k-distance elbow)")
-        search_space = [Integer(5, 100, name='k')]
-        optimization_result = gp_minimize(
-            lambda x: calculate_elbow_angle(x[0], reduced_embedding),
-            dimensions=search_space,
-            n_calls=25,
-            random_state=seed,
-            verbose=False,
-            n_jobs=-1
-        )
-        best_min_samples = optimization_result.x[0]
+class DreamCluster:
+    # Two-stage UMAP + HDBSCAN kept as one persistable model. fit() tunes and
+    # fits everything (reducers on a `fit_sample` subsample when set, the
+    # final HDBSCAN on the full set with prediction_data=True); predict()
+    # places new embeddings with both reducers' transform and
+    # hdbscan.approximate_predict, batch by batch, without refitting.
+    # cache_dir (e.g. "cache/") keeps intrinsic-dimension estimates and UMAP
+    # projections across runs; None, the default, recomputes them.
+    def __init__(self, mode="stability", seed=42, fit_sample=None, batch_size=50_000, id_sample_size=20_000, id_resamples=5, cache_dir=None):
+        if mode.lower() not in ["heuristic", "stability", "mix", "dbcv"]:
+            raise Exception("mode must either be heuristic, stability, mix, or dbcv")
+        self.mode = mode.lower()
+        self.seed = seed
+        self.fit_sample = fit_sample
+        self.batch_size = batch_size
+        self.id_sample_size = id_sample_size
+        self.id_resamples = id_resamples
+        self.cache_dir = cache_dir
+    def _tune(self, reduced_embedding):
+        mode, seed = self.mode, self.seed
+        print(f"Tuning HDBSCAN with mode: '{mode}'")
+        best_min_samples = 5  
         best_min_cluster_size = 5 
-    elif mode.lower() == "mix":
-        print("  -> Using 'mix' mode (Heuristic for min_samples, min_cluster_size = min_samples)")
-        search_space = [Integer(5, 100, name='k')]
-        optimization_result = gp_minimize(
-            lambda x: calculate_elbow_angle(x[0], reduced_embedding),
-            dimensions=search_space,
-            n_calls=25,
-            random_state=seed,
-            verbose=False,
-            n_jobs=-1
+        if mode ==  "heuristic":
+            print("  -> Using 'heuristic' mode (Bayesian Optimization on k-distance elbow)")
+            search_space = [Integer(5, 100, name='k')]
+            elbow_graph = KNNGraph(reduced_embedding, 101)
+            optimization_result = gp_minimize(
+                lambda x: calculate_elbow_angle(x[0], reduced_embedding, elbow_graph),
+                dimensions=search_space,
+                n_calls=25,
+                random_state=seed,
+                verbose=False,
+                n_jobs=-1
+            )
+            best_min_samples = optimization_result.x[0]
+            best_min_cluster_size = 5 
+        elif mode == "mix":
+            print("  -> Using 'mix' mode (Heuristic for min_samples, min_cluster_size = min_samples)")
+            search_space = [Integer(5, 100, name='k')]
+            elbow_graph = KNNGraph(reduced_embedding, 101)
+            optimization_result = gp_minimize(
+                lambda x: calculate_elbow_angle(x[0], reduced_embedding, elbow_graph),
+                dimensions=search_space,
+                n_calls=25,
+                random_state=seed,
+                verbose=False,
+                n_jobs=-1
+            )
+            best_min_samples = optimization_result.x[0]
+            best_min_cluster_size = best_min_samples 
+        elif mode == "dbcv":
+            print("  -> Using 'dbcv' mode (Bayesian Optimization on DBCV score)")
+            best_min_samples, best_min_cluster_size, _ = search_hdbscan(reduced_embedding, mode="dbcv", n_calls=30, seed=seed)
+        else: 
+            print("  -> Using 'stability' mode (Bayesian Optimization on relative_validity)")
+            best_min_samples, best_min_cluster_size, _ = search_hdbscan(reduced_embedding, mode="stability", n_calls=30, seed=seed)
+        return best_min_samples, best_min_cluster_size
+    def _reduce(self, embeddings):
+        return self.second_reductor.transform(self.first_reductor.transform(embeddings))
+    def fit(self, raw_embeddings):
+        seed = self.seed
+        train = raw_embeddings
+        if self.fit_sample and len(raw_embeddings) > self.fit_sample:
+            train = raw_embeddings[np.sort(np.random.default_rng(seed).choice(len(raw_embeddings), self.fit_sample, replace=False))]
+        fingerprint = embedding_fingerprint(train) if self.cache_dir else None
+        estimate, variance = estimate_intrinsic_dimension(
+            train, self.id_sample_size, self.id_resamples, seed, os.path.join(self.cache_dir, "intrinsic") if self.cache_dir else None, fingerprint
+        )
+        intrinsic = int(np.clip(np.round(estimate), 5, 50))
+        print(f"Found intrinsic dimension of {intrinsic} with TwoNN ({estimate:.2f}, variance {variance:.3f})")
+        projections = ProjectionCache(os.path.join(self.cache_dir, "projections") if self.cache_dir else None)
+        def first_stage():
+            print("Running first stage UMAP")
+            return UMAP(n_neighbors=100, n_components=intrinsic, metric="cosine", random_state=seed, min_dist=0.0, n_jobs=-1)
+        reduced_embedding, self.first_reductor, key = projections.project(
+            train, "first", dict(n_neighbors=100, n_components=intrinsic, metric="cosine", min_dist=0.0, seed=seed), first_stage, fingerprint, need_reducer=True
         )
-        best_min_samples = optimization_result.x[0]
-        best_min_cluster_size = best_min_samples 
-    elif mode.lower() == "dbcv":
-        print("  -> Using 'dbcv' mode (Bayesian Optimization on DBCV score)")
-        search_space = [
-            Integer(5, 500, name='min_samples'),
-            Integer(5, 500, name='min_cluster_size')
-        ]
-        optimization_result = gp_minimize(
-            func=lambda params: objective_for_dbcv(params, reduced_embedding),
-            dimensions=search_space,
-            n_calls=30, 
-            random_state=seed,
-            verbose=False,
-            n_jobs=-1
+        def second_stage():
+            print("Running second stage UMAP")
+            return UMAP(n_neighbors=20, n_components=10, metric="euclidean", random_state=seed, min_dist=0.0, n_jobs=-1)
+        reduced_embedding, self.second_reductor, _ = projections.project(
+            reduced_embedding, "second", dict(n_neighbors=20, n_components=10, metric="euclidean", min_dist=0.0, seed=seed), second_stage, key, need_reducer=True
         )
-        best_min_samples, best_min_cluster_size = optimization_result.x
-    else: 
-        print("  -> Using 'stability' mode (Bayesian Optimization on relative_validity)")
-        search_space = [
-            Integer(5, 500, name='min_samples'),
-            Integer(5, 500, name='min_cluster_size')
-        ]
-        optimization_result = gp_minimize(
-            func=lambda params: objective_for_hdbscan(params, reduced_embedding),
-            dimensions=search_space,
-            n_calls=30,
-            random_state=seed,
-            verbose=False,
-            n_jobs=-1
+        best_min_samples, best_min_cluster_size = self._tune(reduced_embedding)
+        print(f"Final params: min_samples={best_min_samples}, min_cluster_size={best_min_cluster_size}")
+        if train is not raw_embeddings:
+            print("Transforming full dataset with trained reducers...")
+            reduced_embedding = np.concatenate([self._reduce(raw_embeddings[i:i + self.batch_size]) for i in range(0, len(raw_embeddings), self.batch_size)])
+        self.clusterer = HDBSCAN(
+            min_cluster_size=best_min_cluster_size,
+            min_samples=best_min_samples,
+            metric="euclidean",
+            allow_single_cluster=False,
+            core_dist_n_jobs=-1,
+            cluster_selection_method="eom",
+            gen_min_span_tree=True,
+            prediction_data=True
         )
-        best_min_samples, best_min_cluster_size = optimization_result.x
-    print(f"Final params: min_samples={best_min_samples}, min_cluster_size={best_min_cluster_size}")
-    clusterer = HDBSCAN(
-        min_cluster_size=best_min_cluster_size,
-        min_samples=best_min_samples,
-        metric="euclidean",
-        allow_single_cluster=False,
-        core_dist_n_jobs=-1,
-        cluster_selection_method="eom",
-        gen_min_span_tree=True
-    )
-    print("Predicting clusters with HDBSCAN")
-    labels = clusterer.fit_predict(reduced_embedding) #type: ignore
-    return reduced_embedding, labels, clusterer.probabilities_
\ No newline at end of file
+        print("Predicting clusters with HDBSCAN")
+        self.labels_ = self.clusterer.fit_predict(reduced_embedding) #type: ignore
+        self.probabilities_ = self.clusterer.probabilities_
+        self.reduced_embedding_ = reduced_embedding
+        return self
+    def predict(self, embeddings, batch_size=None):
+        batch_size = batch_size or self.batch_size
+        labels, probabilities, reduced = [], [], []
+        for i in range(0, len(embeddings), batch_size):
+            batch = self._reduce(embeddings[i:i + batch_size])
+            batch_labels, batch_probabilities = approximate_predict(self.clusterer, batch)
+            labels.append(batch_labels)
+            probabilities.append(batch_probabilities)
+            reduced.append(batch)
+        if not reduced:
+            return np.empty(0, dtype=np.intp), np.empty(0), np.empty((0, 10), dtype=np.float32)
+        return np.concatenate(labels), np.concatenate(probabilities), np.concatenate(reduced)
+    def save(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        joblib.dump(self, path)
+    @staticmethod
+    def load(path):
+        return joblib.load(path)
+def cluster_custom(raw_embeddings, seed=42, mode="stability", cache_dir=None):
+    model = DreamCluster(mode, seed, cache_dir=cache_dir).fit(raw_embeddings)
+    return model.reduced_embedding_, model.labels_, model.probabilities_
\ No newline at end of file
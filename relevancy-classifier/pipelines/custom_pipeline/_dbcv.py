@@ -0,0 +1,103 @@
+import numpy as np
+from hdbscan._hdbscan_linkage import mst_linkage_core_vector
+from hdbscan.dist_metrics import DistanceMetric
+from sklearn.metrics import pairwise_distances_chunked
+# DBCV (Moulavi et al., 2014), same value as hdbscan.validity.validity_index
+# but without its all-pairs matrices: core distances and density separation
+# are reduced chunk by chunk (memory bounded by working_memory, in MiB) and
+# each cluster's mutual-reachability MST comes from the Prim routine HDBSCAN
+# itself uses, which keeps O(n) memory. Time is still quadratic in cluster
+# size, so for the full corpus use subsampled_validity_index.
+def _core_distances(points, d, working_memory):
+    def reduce(chunk, start):
+        inverse = np.zeros_like(chunk)
+        np.power(chunk, -float(d), out=inverse, where=chunk != 0)
+        return inverse.sum(axis=1)
+    total = np.concatenate(list(pairwise_distances_chunked(points, reduce_func=reduce, working_memory=working_memory)))
+    if total.sum() == 0:
+        return np.zeros(len(points))
+    total /= max(len(points) - 1, 1)
+    with np.errstate(divide="ignore"):
+        return total ** (-1.0 / d)
+def _internal_mst(points, core, working_memory):
+    if len(points) < 2:
+        return np.arange(len(points)), 0.0
+    tree = mst_linkage_core_vector(points, core, DistanceMetric.get_metric("euclidean"), 1.0)
+    # The MST is far from unique (most mutual reachabilities are a core
+    # distance), so re-attach every edge the way validity_index does: to the
+    # lowest-index earlier node at that distance, giving the same internal nodes.
+    added = tree[:, 1].astype(np.intp)
+    step = np.zeros(len(points), dtype=np.intp)
+    step[added] = np.arange(1, len(points))
+    def reduce(chunk, start):
+        rows = slice(start, start + len(chunk))
+        mr = np.maximum(chunk, np.maximum(core[added[rows], None], core[None, :]))
+        candidates = np.isclose(mr, tree[rows, 2, None]) & (step[None, :] < step[added[rows], None])
+        return candidates.argmax(axis=1)
+    tree[:, 0] = np.concatenate(list(pairwise_distances_chunked(points[added], points, reduce_func=reduce, working_memory=working_memory)))
+    degree = np.bincount(tree[:, :2].astype(np.intp).ravel(), minlength=len(points))
+    vertices = np.flatnonzero(degree > 1)
+    if not len(vertices):
+        vertices = np.array([0])
+    internal = np.isin(tree[:, 0], vertices) & np.isin(tree[:, 1], vertices)
+    edges = tree[internal, 2] if internal.any() else tree[:, 2]
+    return vertices, float(edges.max())
+def _separation(points, core, cluster, n_clusters, working_memory):
+    order = np.argsort(cluster, kind="stable")
+    points, core, cluster = points[order], core[order], cluster[order]
+    starts = np.searchsorted(cluster, np.arange(n_clusters))
+    separation = np.full((n_clusters, n_clusters), np.inf)
+    def reduce(chunk, start):
+        rows = slice(start, start + len(chunk))
+        mr = np.maximum(chunk, np.maximum(core[rows, None], core[None, :]))
+        per_cluster = np.minimum.reduceat(mr, starts, axis=1)
+        np.minimum.at(separation, cluster[rows], per_cluster)
+        return np.empty(len(chunk))
+    for _ in pairwise_distances_chunked(points, reduce_func=reduce, working_memory=working_memory):
+        pass
+    np.fill_diagonal(separation, np.inf)
+    return separation
+def fast_validity_index(X, labels, per_cluster_scores=False, working_memory=256):
+    X = np.asarray(X, dtype=np.float64)
+    labels = np.asarray(labels)
+    d = X.shape[1]
+    cluster_ids = np.unique(labels[labels != -1])
+    if len(cluster_ids) < 2:
+        raise Exception("DBCV needs at least two clusters")
+    sparseness = np.zeros(len(cluster_ids))
+    sizes = np.zeros(len(cluster_ids))
+    nodes, node_core, node_cluster = [], [], []
+    for c, cluster_id in enumerate(cluster_ids):
+        members = np.flatnonzero(labels == cluster_id)
+        core = _core_distances(X[members], d, working_memory)
+        vertices, sparseness[c] = _internal_mst(X[members], core, working_memory)
+        sizes[c] = len(members)
+        nodes.append(members[vertices])
+        node_core.append(core[vertices])
+        node_cluster.append(np.full(len(vertices), c))
+    separation = _separation(
+        X[np.concatenate(nodes)], np.concatenate(node_core), np.concatenate(node_cluster), len(cluster_ids), working_memory
+    )
+    min_separation = separation.min(axis=1)
+    validity = (min_separation - sparseness) / np.maximum(min_separation, sparseness)
+    result = float(np.sum(sizes * validity) / len(labels))
+    if per_cluster_scores:
+        return result, validity
+    return result
+def subsampled_validity_index(X, labels, sample_size=10_000, n_resamples=10, ci=0.95, seed=42, working_memory=256):
+    # Label-stratified subsamples (noise keeps its share) scored with
+    # fast_validity_index; returns the mean and a percentile interval.
+    labels = np.asarray(labels)
+    rng = np.random.default_rng(seed)
+    groups = [np.flatnonzero(labels == label) for label in np.unique(labels)]
+    fraction = min(1.0, sample_size / len(labels))
+    scores = []
+    for _ in range(n_resamples):
+        sample = np.sort(np.concatenate([
+            rng.choice(group, size=min(len(group), max(3, int(round(len(group) * fraction)))), replace=False)
+            for group in groups
+        ]))
+        scores.append(fast_validity_index(X[sample], labels[sample], working_memory=working_memory))
+    scores = np.array(scores)
+    low, high = np.quantile(scores, [(1 - ci) / 2, (1 + ci) / 2])
+    return float(scores.mean()), (float(low), float(high))
@@ -0,0 +1,31 @@
+import os
+import numpy as np
+import skdim
+from sklearn.neighbors import NearestNeighbors
+from .._cache import cache_key, embedding_fingerprint, read_json, write_json
+def estimate_intrinsic_dimension(data, sample_size=20_000, n_resamples=5, seed=42, cache_dir="cache/intrinsic", fingerprint=None):
+    # TwoNN averaged over n_resamples random subsets of sample_size rows
+    # (drawn without replacement: duplicated rows give zero distances and
+    # break the estimator). Returns (mean, variance) across subsets, cached
+    # as JSON under the embedding fingerprint and the sampling parameters.
+    if len(data) <= sample_size:
+        n_resamples = 1
+    fingerprint = fingerprint or embedding_fingerprint(data)
+    path = os.path.join(cache_dir, cache_key(fingerprint, sample_size=sample_size, n_resamples=n_resamples, seed=seed) + ".json") if cache_dir else None
+    cached = read_json(path) if path else None
+    if cached is not None:
+        print(f"Loaded cached intrinsic dimension from {path}")
+        return cached["mean"], cached["variance"]
+    rng = np.random.default_rng(seed)
+    estimates = []
+    for _ in range(n_resamples):
+        sample = data if len(data) <= sample_size else data[np.sort(rng.choice(len(data), sample_size, replace=False))]
+        # skdim sorts whole distance rows for wide data; a parallel 3-NN query
+        # gives the same (r1, r2) pairs, which TwoNN(dist=True) accepts as is
+        distances, _ = NearestNeighbors(n_neighbors=3, n_jobs=-1).fit(sample).kneighbors(sample)
+        estimates.append(float(skdim.id.TwoNN(dist=True).fit(distances[:, 1:]).dimension_))
+    mean = float(np.mean(estimates))
+    variance = float(np.var(estimates, ddof=1)) if len(estimates) > 1 else 0.0
+    if path:
+        write_json(path, {"mean": mean, "variance": variance, "estimates": estimates, "rows": len(data)})
+    return mean, variance
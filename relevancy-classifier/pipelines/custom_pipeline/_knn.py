@@ -0,0 +1,21 @@
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+class KNNGraph:
+    # One exact k_max-neighbour graph (self included at column 0), built once
+    # and sliced for every smaller k, so the elbow search's optimizer calls
+    # never refit NearestNeighbors. The UMAP stages are not fed from here:
+    # each runs in its own space and builds its graph once internally.
+    def __init__(self, data, k_max, metric="euclidean", n_jobs=-1):
+        self.k_max = k_max
+        self.metric = metric
+        neighbors = NearestNeighbors(n_neighbors=k_max, metric=metric, n_jobs=n_jobs).fit(data)
+        distances, indices = neighbors.kneighbors(data)
+        self.indices = np.ascontiguousarray(indices)
+        self.distances = np.ascontiguousarray(distances, dtype=np.float32)
+    def knn(self, k):
+        if k > self.k_max:
+            raise Exception(f"graph was built for k <= {self.k_max}, got {k}")
+        return self.indices[:, :k], self.distances[:, :k]
+    def kth_distances(self, k):
+        # distance to the k-th neighbour, not counting the point itself
+        return self.knn(k + 1)[1][:, k]
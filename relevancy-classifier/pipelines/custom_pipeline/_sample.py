@@ -1,17 +1,138 @@
 import math
 import numpy as np
-from datasets import Dataset, concatenate_datasets
-from tqdm import tqdm
-from typing import Dict, Any
+from datasets import Dataset
+from typing import Dict, Tuple
+FILTER_MODES = ["above_mean", "below_mean", "above_mean_std", "none"]
+INTER_CLUSTER_STRATEGIES = ["equal", "direct_proportion"]
+INTRA_CLUSTER_BIASES = ["uniform", "inverse_prob", "mild_inverse_prob", "confidence_prob"]
+class _ClusterGroups:
+    # Non-noise rows grouped by cluster once: `rows` are their positions in
+    # the full dataset, `cluster` their dense cluster ids, and the
+    # per-cluster probability mean/std come from bincount sums.
+    def __init__(self, labels: np.ndarray, probabilities: np.ndarray):
+        labels = np.asarray(labels)
+        self.rows = np.flatnonzero(labels != -1)
+        self.probabilities = np.asarray(probabilities, dtype=np.float64)[self.rows]
+        self.labels, self.cluster = np.unique(labels[self.rows], return_inverse=True)
+        self.cluster = self.cluster.ravel()
+        self.num_clusters = int(self.cluster.max()) + 1 if len(self.rows) else 0
+        sizes = np.bincount(self.cluster, minlength=self.num_clusters)
+        self.mean = np.bincount(self.cluster, self.probabilities, self.num_clusters) / np.maximum(sizes, 1)
+        deviation = self.probabilities - self.mean[self.cluster]
+        self.std = np.sqrt(np.bincount(self.cluster, deviation * deviation, self.num_clusters) / np.maximum(sizes, 1))
+    def filter(self, filter_mode: str) -> np.ndarray:
+        mean = self.mean[self.cluster]
+        if filter_mode == "above_mean":
+            return self.probabilities > mean
+        elif filter_mode == "below_mean":
+            return self.probabilities <= mean
+        elif filter_mode == "above_mean_std":
+            return self.probabilities > mean - self.std[self.cluster]
+        return np.ones(len(self.rows), dtype=bool)
+def _budgets(counts: np.ndarray, target_dataset_count: int, inter_cluster_strategy: str) -> np.ndarray:
+    present = counts > 0
+    budgets = np.zeros(len(counts), dtype=np.int64)
+    if inter_cluster_strategy == "equal":
+        budgets[present] = math.ceil(target_dataset_count / present.sum())
+    elif inter_cluster_strategy == "direct_proportion":
+        # np.round matches round(): both round half to even
+        budgets = np.round(counts / counts.sum() * target_dataset_count).astype(np.int64)
+    budgets = np.minimum(budgets, counts)
+    budgets[present & (budgets == 0)] = 1
+    return budgets
+def _weights(probabilities: np.ndarray, intra_cluster_bias: str) -> np.ndarray:
+    if intra_cluster_bias == "inverse_prob":
+        return 1.0 / (probabilities + 1e-6)
+    elif intra_cluster_bias == "mild_inverse_prob":
+        return (1.0 - probabilities) + 1e-5
+    elif intra_cluster_bias == "confidence_prob":
+        return probabilities
+    return np.ones_like(probabilities)
+def _draw(groups: _ClusterGroups, keep: np.ndarray, budgets: np.ndarray, weights: np.ndarray, exponentials: np.ndarray) -> np.ndarray:
+    # Weighted sampling without replacement for every cluster at once
+    # (Efraimidis-Spirakis): each row gets key E / w with E ~ Exp(1) and the
+    # `budget` smallest keys of a cluster are its sample, which is the same
+    # distribution as successive np.random.choice(replace=False, p=w).
+    positions = np.flatnonzero(keep)
+    cluster = groups.cluster[positions]
+    # zero-weight rows get key inf and would quietly fill a budget the
+    # weighted rows cannot cover; np.random.choice(p=w) raised here too
+    drawable = np.bincount(cluster[weights[positions] > 0], minlength=groups.num_clusters)
+    short = np.flatnonzero(budgets > drawable)
+    if len(short):
+        c = short[0]
+        raise Exception(f"cluster {groups.labels[c]} needs {budgets[c]} rows but only {drawable[c]} have non-zero weight")
+    with np.errstate(divide="ignore"):
+        keys = exponentials[positions] / weights[positions]
+    order = np.lexsort((keys, cluster))
+    cluster = cluster[order]
+    starts = np.searchsorted(cluster, np.arange(groups.num_clusters))
+    rank = np.arange(len(order)) - starts[cluster]
+    return groups.rows[positions[order[rank < budgets[cluster]]]]
+def ablation_indices(
+    labels: np.ndarray,
+    probabilties: np.ndarray,
+    target_dataset_count: int,
+    seed: int,
+    filter_mode: str = "above_mean_std",
+    inter_cluster_strategy: str = "direct_proportion",
+    intra_cluster_bias: str = "uniform",
+) -> np.ndarray:
+    """
+    Row indices (into the full, noise-included dataset) of one ablation
+    sample; see generate_ablation_sample for the three grid dimensions.
+    """
+    grid = ablation_grid(
+        labels, probabilties, target_dataset_count, seed,
+        filter_modes=[filter_mode],
+        inter_cluster_strategies=[inter_cluster_strategy],
+        intra_cluster_biases=[intra_cluster_bias],
+    )
+    return grid[(filter_mode, inter_cluster_strategy, intra_cluster_bias)]
+def ablation_grid(
+    labels: np.ndarray,
+    probabilties: np.ndarray,
+    target_dataset_count: int,
+    seed: int,
+    filter_modes=FILTER_MODES,
+    inter_cluster_strategies=INTER_CLUSTER_STRATEGIES,
+    intra_cluster_biases=INTRA_CLUSTER_BIASES,
+) -> Dict[Tuple[str, str, str], np.ndarray]:
+    """
+    Index arrays for every (filter_mode, inter_cluster_strategy,
+    intra_cluster_bias) combination in one pass over the labels.
+
+    Clusters are grouped once and every combination reuses the same
+    Exp(1) draw from a single Generator, so samples differ only by the
+    ablated setting. Select a sample with dataset.select(grid[key]).
+    """
+    groups = _ClusterGroups(labels, probabilties)
+    exponentials = np.random.default_rng(seed).exponential(size=len(groups.rows))
+    weights = {bias: _weights(groups.probabilities, bias) for bias in intra_cluster_biases}
+    grid = {}
+    for filter_mode in filter_modes:
+        keep = groups.filter(filter_mode)
+        if not keep.any():
+            grid.update({(filter_mode, inter, intra): np.empty(0, dtype=np.int64)
+                         for inter in inter_cluster_strategies for intra in intra_cluster_biases})
+            continue
+        counts = np.bincount(groups.cluster[keep], minlength=groups.num_clusters)
+        for inter_cluster_strategy in inter_cluster_strategies:
+            budgets = _budgets(counts, target_dataset_count, inter_cluster_strategy)
+            for intra_cluster_bias in intra_cluster_biases:
+                grid[(filter_mode, inter_cluster_strategy, intra_cluster_bias)] = _draw(
+                    groups, keep, budgets, weights[intra_cluster_bias], exponentials
+                )
+    return grid
 def generate_ablation_sample(
-    dataset: Dataset, 
-    labels: np.ndarray, 
-    probabilties: np.ndarray, 
-    target_dataset_count: int, 
+    dataset: Dataset,
+    labels: np.ndarray,
+    probabilties: np.ndarray,
+    target_dataset_count: int,
     seed: int,
-    filter_mode: str = "above_mean_std",  
-    inter_cluster_strategy: str = "direct_proportion", 
-    intra_cluster_bias: str = "uniform" 
+    filter_mode: str = "above_mean_std",
+    inter_cluster_strategy: str = "direct_proportion",
+    intra_cluster_bias: str = "uniform"
 ):
     """
     Generates a sample set based on the full 3-Dimensional ablation grid:
@@ -19,90 +140,11 @@ def generate_ablation_sample(
     2. Calculates sample counts based on inter-cluster strategy (e.g., direct proportion).
     3. Selects points within the cluster based on intra-cluster bias (e.g., inverse probability).
     """
-    labels = np.array(labels)
-    probabilties = np.array(probabilties) 
-    dataset_mask = labels != -1
-    dataset = dataset.select(np.where(dataset_mask)[0])
-    labels = labels[dataset_mask]
-    probabilties = probabilties[dataset_mask]
-    distinct_labels = np.unique(labels)
-    cluster_data_map = {} 
-    total_filtered_points = 0
-    print(f"Applying Filter Mode: '{filter_mode}'")
-    for label in distinct_labels:
-        cluster_mask = labels == label
-        cluster_indices_original = np.where(cluster_mask)[0]
-        cluster_probabilities = probabilties[cluster_mask]
-        if len(cluster_indices_original) == 0: continue
-        cluster_mean_prob = np.mean(cluster_probabilities)
-        cluster_std_prob = np.std(cluster_probabilities)
-        if filter_mode == "above_mean":
-            filter_mask = cluster_probabilities > cluster_mean_prob
-        elif filter_mode == "below_mean":
-            filter_mask = cluster_probabilities <= cluster_mean_prob
-        elif filter_mode == "above_mean_std":
-            threshold = cluster_mean_prob - cluster_std_prob
-            filter_mask = cluster_probabilities > threshold
-        else: 
-            filter_mask = np.ones_like(cluster_probabilities, dtype=bool) 
-        valid_indices_in_cluster = np.where(filter_mask)[0]
-        if len(valid_indices_in_cluster) > 0:
-            original_dataset_indices = cluster_indices_original[valid_indices_in_cluster]
-            cluster_data_map[label] = {
-                "indices": original_dataset_indices,
-                "count": len(original_dataset_indices),
-                "probabilities": cluster_probabilities[valid_indices_in_cluster] 
-            }
-            total_filtered_points += len(original_dataset_indices)
-    if total_filtered_points == 0:
+    print(f"Sampling with filter_mode='{filter_mode}', inter_cluster_strategy='{inter_cluster_strategy}', intra_cluster_bias='{intra_cluster_bias}'")
+    indices = ablation_indices(
+        labels, probabilties, target_dataset_count, seed, filter_mode, inter_cluster_strategy, intra_cluster_bias
+    )
+    if len(indices) == 0:
         print("Warning: Filter removed all data. Returning empty dataset.")
         return None
-    sample_budget_map: Dict[Any, int] = {}
-    num_clusters = len(cluster_data_map)
-    print(f"Calculating Inter-Cluster Strategy: '{inter_cluster_strategy}'")
-    if inter_cluster_strategy == "equal":
-        per_cluster_budget = math.ceil(target_dataset_count / num_clusters)
-        for label in cluster_data_map.keys():
-            sample_budget_map[label] = per_cluster_budget
-    elif inter_cluster_strategy == "direct_proportion":
-        for label, data in cluster_data_map.items():
-            proportion = data["count"] / total_filtered_points
-            sample_budget_map[label] = round(proportion * target_dataset_count)
-    final_sample_datasets = []
-    print(f"Executing Intra-Cluster Bias: '{intra_cluster_bias}'")
-    for label, data in tqdm(cluster_data_map.items()):
-        num_to_sample = sample_budget_map.get(label, 0)
-        if num_to_sample > data["count"]:
-            num_to_sample = data["count"]
-        if num_to_sample == 0 and data["count"] > 0:
-            num_to_sample = 1
-        if num_to_sample <= 0: continue
-        weights = None 
-        if intra_cluster_bias == "inverse_prob":
-            weights = 1.0 / (data["probabilities"] + 1e-6)
-            weights = weights / np.sum(weights)
-        elif intra_cluster_bias == "mild_inverse_prob":
-            weights = (1.0 - data["probabilities"]) + 1e-5
-            weights = weights / np.sum(weights)
-        elif intra_cluster_bias == "confidence_prob":
-            weights = data["probabilities"]
-            weights = weights / np.sum(weights)
-        np.random.seed(seed)
-        if weights is not None and len(weights) == len(data["indices"]):
-            sampled_indices_in_cluster = np.random.choice(
-                data["indices"], 
-                size=int(num_to_sample), 
-                replace=False,
-                p=weights.ravel()
-            )
-        else:
-            sampled_indices_in_cluster = np.random.choice(
-                data["indices"], 
-                size=int(num_to_sample), 
-                replace=False
-            )
-        sampled_sets = dataset.select(sampled_indices_in_cluster.tolist())
-        final_sample_datasets.append(sampled_sets)
-    if not final_sample_datasets:
-        return None
-    return concatenate_datasets(final_sample_datasets)
\ No newline at end of file
+    return dataset.select(indices)
@@ -0,0 +1,107 @@
+import os, shutil, tempfile
+import numpy as np
+from hdbscan import HDBSCAN
+from joblib import Parallel, delayed
+from skopt import Optimizer
+from skopt.space import Integer
+from ._dbcv import fast_validity_index, subsampled_validity_index
+def relative_validity(min_spanning_tree, labels):
+    # Vectorized HDBSCAN.relative_validity_ (same DBCV approximation over the
+    # mutual-reachability MST, without the per-edge pandas loop)
+    sizes = np.bincount(labels + 1)
+    cluster_size = sizes[1:]
+    num_clusters = len(cluster_size)
+    total = len(labels)
+    a = labels[min_spanning_tree[:, 0].astype(np.intp)]
+    b = labels[min_spanning_tree[:, 1].astype(np.intp)]
+    length = min_spanning_tree[:, 2]
+    max_distance = length.max() if len(length) else 0.0
+    one_noise = (a == -1) != (b == -1)
+    min_outlier_sep = length[one_noise].min() if one_noise.any() else max_distance
+    DSC = np.zeros(num_clusters)
+    same = (a == b) & (a != -1)
+    np.maximum.at(DSC, a[same], length[same])
+    DSPC_wrt = np.full(num_clusters, np.inf)
+    between = (a != b) & (a != -1) & (b != -1)
+    np.minimum.at(DSPC_wrt, a[between], length[between])
+    np.minimum.at(DSPC_wrt, b[between], length[between])
+    DSPC_wrt[DSPC_wrt == np.inf] = 2 * (max_distance if num_clusters > 1 else min_outlier_sep)
+    V_index = (DSPC_wrt - DSC) / np.maximum(DSPC_wrt, DSC)
+    return float(np.sum(cluster_size * V_index / total))
+def dbcv_objective(data, labels, sample_size=20_000):
+    non_noise_indices = np.where(labels != -1)[0]
+    if len(np.unique(labels[non_noise_indices])) < 2:
+        return 1.0
+    try:
+        if len(non_noise_indices) > sample_size:
+            return -subsampled_validity_index(data[non_noise_indices], labels[non_noise_indices], sample_size=sample_size, n_resamples=3)[0]
+        return -fast_validity_index(data[non_noise_indices], labels[non_noise_indices])
+    except Exception:
+        return 1.0
+def _evaluate(data, min_samples, min_cluster_sizes, mode, cachedir, core_dist_n_jobs):
+    # HDBSCAN caches its tree build through `memory` keyed on the data and
+    # min_samples (not min_cluster_size), so every size after the first,
+    # and every worker sharing cachedir, only redoes the condensed tree.
+    scores = {}
+    for min_cluster_size in min_cluster_sizes:
+        if mode == "dbcv" and min_samples > min_cluster_size:
+            scores[min_cluster_size] = 1.0
+            continue
+        clusterer = HDBSCAN(
+            min_samples=min_samples,
+            min_cluster_size=min_cluster_size,
+            metric="euclidean",
+            gen_min_span_tree=True,
+            allow_single_cluster=False,
+            core_dist_n_jobs=core_dist_n_jobs,
+            cluster_selection_method="eom",
+            memory=cachedir,
+        )
+        clusterer.fit(data)
+        if mode == "dbcv":
+            scores[min_cluster_size] = dbcv_objective(data, clusterer.labels_)
+        else:
+            scores[min_cluster_size] = -relative_validity(clusterer._min_spanning_tree, clusterer.labels_)
+    return min_samples, scores
+def search_hdbscan(data, mode="stability", n_calls=30, seed=42, n_jobs=-1, n_points=None, low=5, high=500, cachedir=None):
+    # Batched Bayesian search over (min_samples, min_cluster_size). Each
+    # round asks for n_points candidates and runs one process per distinct
+    # min_samples so its MST is built once; pairs proposed again are served
+    # from the memo. Objectives are minimized, as with gp_minimize.
+    workers = os.cpu_count() if n_jobs == -1 else max(1, n_jobs)
+    n_points = n_points or min(workers, 8)
+    core_dist_n_jobs = max(1, (os.cpu_count() or 1) // min(workers, n_points))
+    optimizer = Optimizer(
+        [Integer(low, high, name="min_samples"), Integer(low, high, name="min_cluster_size")],
+        base_estimator="GP",
+        n_initial_points=10,
+        acq_func="EI",
+        random_state=seed,
+    )
+    temporary = cachedir is None
+    cachedir = cachedir or tempfile.mkdtemp(prefix="hdbscan-search-")
+    memo = {}
+    try:
+        evaluated = 0
+        while evaluated < n_calls:
+            points = [tuple(int(v) for v in p) for p in optimizer.ask(n_points=min(n_points, n_calls - evaluated))]
+            pending = {}
+            for min_samples, min_cluster_size in points:
+                if (min_samples, min_cluster_size) not in memo:
+                    pending.setdefault(min_samples, set()).add(min_cluster_size)
+            results = Parallel(n_jobs=min(workers, max(1, len(pending))))(
+                delayed(_evaluate)(data, ms, sorted(sizes), mode, cachedir, core_dist_n_jobs)
+                for ms, sizes in pending.items()
+            )
+            for min_samples, scores in results:
+                for min_cluster_size, score in scores.items():
+                    memo[(min_samples, min_cluster_size)] = score
+            optimizer.tell([list(p) for p in points], [memo[p] for p in points])
+            evaluated += len(points)
+            best = min(memo, key=memo.get)
+            print(f"  {evaluated}/{n_calls} evaluated ({len(memo)} unique), best {best} -> {memo[best]:.4f}")
+    finally:
+        if temporary:
+            shutil.rmtree(cachedir, ignore_errors=True)
+    best_min_samples, best_min_cluster_size = min(memo, key=memo.get)
+    return best_min_samples, best_min_cluster_size, memo
@@ -0,0 +1,58 @@
+import numpy as np
+from typing import Dict
+
+
+class ClusterGroups:
+    """
+    Row indices grouped by cluster label, built once per labeling.
+
+    A single stable argsort orders the rows cluster by cluster, so
+    `indices(c)` is a slice (ascending, like `all_indices[labels == c]`)
+    instead of an O(n) mask per cluster.
+    """
+
+    def __init__(self, labels: np.ndarray, n_clusters: int = None):
+        labels = np.asarray(labels)
+        self.n_clusters = int(labels.max()) + 1 if n_clusters is None else n_clusters
+        self.order = np.argsort(labels, kind="stable")
+        self.counts = np.bincount(labels, minlength=self.n_clusters)
+        self.starts = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+
+    def indices(self, cluster_id: int) -> np.ndarray:
+        start = self.starts[cluster_id]
+        return self.order[start:start + self.counts[cluster_id]]
+
+
+def balanced_sample(groups: ClusterGroups, n_samples: int, rng: np.random.RandomState) -> np.ndarray:
+    """
+    Balanced stratified sample of `n_samples` indices across all clusters.
+
+    Every cluster gets n_samples // k indices, the first n_samples % k
+    clusters one extra; clusters smaller than their share are taken whole.
+    The result is shuffled so it is not ordered by cluster.
+    """
+    n_per_cluster = n_samples // groups.n_clusters
+    remainder = n_samples % groups.n_clusters
+    print(f"Sampling {n_per_cluster} from most clusters, "
+          f"with {remainder} clusters getting one extra sample.")
+    sample_sizes: Dict[int, int] = {
+        cluster_id: n_per_cluster + (1 if cluster_id < remainder else 0) for cluster_id in range(groups.n_clusters)
+    }
+    sampled_indices_list = []
+    for cluster_id, n_to_sample in sample_sizes.items():
+        indices_in_cluster = groups.indices(cluster_id)
+        if len(indices_in_cluster) == 0:
+            print(f"  Warning: Cluster {cluster_id} has 0 samples. Skipping.")
+            continue
+        if n_to_sample > len(indices_in_cluster):
+            print(f"  Warning: Cluster {cluster_id} only has {len(indices_in_cluster)} "
+                  f"samples (less than target {n_to_sample}). Taking all.")
+        chosen_indices = rng.choice(
+            indices_in_cluster,
+            size=min(n_to_sample, len(indices_in_cluster)),
+            replace=False
+        )
+        sampled_indices_list.append(chosen_indices)
+    sampled_indices = np.concatenate(sampled_indices_list)
+    rng.shuffle(sampled_indices)
+    return sampled_indices
@@ -1,14 +1,18 @@
+import os
+import shutil
+import tempfile
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.metrics import silhouette_score
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, List, Union
 from joblib import Parallel, delayed
 
 def _fit_one_k(k: int, data: np.ndarray, random_state: int) -> Dict[str, Any]:
     """
     Helper function to fit a single KMeans model for a given k.
-    This is the function that will be run in parallel.
+    This is the function that will be run in parallel; the fitted model
+    is returned too so the winner does not have to be fit again.
     """
     kmeans = KMeans(
         n_clusters=k, 
@@ -21,21 +25,169 @@ def _fit_one_k(k: int, data: np.ndarray, random_state: int) -> Dict[str, Any]:
     return {
         'k': k,
         'inertia': kmeans.inertia_,
-        'silhouette_score': silhouette_avg
+        'silhouette_score': silhouette_avg,
+        'model': kmeans
     }
 
+def _sampled_silhouette(
+    data: np.ndarray,
+    labels: np.ndarray,
+    sample_size: int,
+    n_resamples: int,
+    rng: np.random.Generator,
+    ci: float = 0.95
+) -> Tuple[float, float, float]:
+    """
+    Silhouette on cluster-stratified subsamples of about `sample_size` rows.
+    Returns the mean over `n_resamples` draws and a percentile interval.
+    """
+    order = np.argsort(labels, kind="stable")
+    counts = np.bincount(labels)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    fraction = min(1.0, sample_size / len(labels))
+    scores = []
+    for _ in range(n_resamples):
+        sample = np.concatenate([
+            order[start + rng.choice(count, size=min(count, max(2, int(round(count * fraction)))), replace=False)]
+            for start, count in zip(starts, counts) if count
+        ])
+        sample = np.sort(sample)
+        scores.append(silhouette_score(data[sample], labels[sample]))
+    low, high = np.quantile(scores, [(1 - ci) / 2, (1 + ci) / 2])
+    return float(np.mean(scores)), float(low), float(high)
+
+def _next_center(data: np.ndarray, centers: np.ndarray, rng: np.random.Generator, sample_size: int) -> np.ndarray:
+    """k-means++ step: one new center drawn with probability proportional to D^2."""
+    candidates = data[np.sort(rng.choice(len(data), size=min(sample_size, len(data)), replace=False))]
+    d2 = ((candidates[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1).min(axis=1)
+    if d2.sum() == 0:
+        return candidates[rng.integers(len(candidates))]
+    return candidates[rng.choice(len(candidates), p=d2 / d2.sum())]
+
+def _fit_k_chain(
+    k_values: List[int],
+    data_path: str,
+    random_state: int,
+    sample_size: int,
+    n_resamples: int,
+    batch_size: int
+) -> List[Dict[str, Any]]:
+    """
+    Fits MiniBatchKMeans for a run of consecutive k. Every k after the first
+    is fit twice: warm-started from the previous k's centers plus one
+    k-means++ center, and from a fresh k-means++ init, keeping the lower
+    inertia. Both fits are kept on purpose. On well separated data the warm
+    start often stops early in the previous k's optimum, with one cluster
+    split badly. On nine Gaussian blobs it gave k=7 and k=8 about 30% more
+    inertia than a fresh fit, so the sweep picked k=10 instead of 9. The
+    extra fit is cheap next to the `n_resamples` sampled silhouettes that
+    dominate each k, and the warm start still wins whenever the chain
+    carries a better solution. Every k draws from its own Generator seeded
+    with (random_state, k), so results depend only on the fixed chain
+    layout, never on how many workers run it. `data_path` is a .npy file
+    opened memory-mapped, so workers share the page cache instead of each
+    receiving a pickled copy.
+    """
+    data = np.load(data_path, mmap_mode="r")
+    results = []
+    centers = None
+    for k in k_values:
+        rng = np.random.default_rng([random_state, k])
+        seed = int(rng.integers(2**31 - 1))
+        inits = ["k-means++"]
+        if centers is not None:
+            inits.append(np.vstack([centers, _next_center(data, centers, rng, sample_size)]))
+        kmeans = min(
+            (
+                MiniBatchKMeans(
+                    n_clusters=k,
+                    init=init,
+                    n_init=1,
+                    batch_size=batch_size,
+                    random_state=seed
+                ).fit(data)
+                for init in inits
+            ),
+            key=lambda model: model.inertia_
+        )
+        centers = kmeans.cluster_centers_
+        silhouette_avg, low, high = _sampled_silhouette(data, kmeans.labels_, sample_size, n_resamples, rng)
+        results.append({
+            'k': k,
+            'inertia': kmeans.inertia_,
+            'silhouette_score': silhouette_avg,
+            'silhouette_low': low,
+            'silhouette_high': high,
+            'model': kmeans
+        })
+    return results
+
+def _scalable_sweep(
+    data: np.ndarray,
+    k_values: range,
+    random_state: int,
+    sample_size: int,
+    n_resamples: int,
+    batch_size: int,
+    chain_length: int
+) -> List[Dict[str, Any]]:
+    # fixed runs of `chain_length` consecutive k; the worker count only
+    # changes how many run at once
+    k_values = list(k_values)
+    chains = [k_values[i:i + chain_length] for i in range(0, len(k_values), chain_length)]
+    workdir = tempfile.mkdtemp(prefix="kmeans-sweep-")
+    try:
+        data_path = os.path.join(workdir, "data.npy")
+        np.save(data_path, np.ascontiguousarray(data, dtype=np.float32))
+        chained = Parallel(n_jobs=min(len(chains), os.cpu_count() or 1))(
+            delayed(_fit_k_chain)(chain, data_path, random_state, sample_size, n_resamples, batch_size)
+            for chain in chains
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return [result for chain in chained for result in chain]
+
 def find_optimal_kmeans_clusters(
     data: np.ndarray, 
     k_max: int, 
     k_min: int = 2, 
-    random_state: int = 42
-) -> Tuple[KMeans, pd.DataFrame, int]:
-    k_values = range(k_min, k_max + 1)
-    print(f"Optimizing KMeans in PARALLEL for k from {k_min} to {k_max} across all cores...")
+    random_state: int = 42,
+    mode: str = "exact",
+    sample_size: int = 10_000,
+    n_resamples: int = 5,
+    batch_size: int = 4096,
+    chain_length: int = 4
+) -> Tuple[Union[KMeans, MiniBatchKMeans], pd.DataFrame, int]:
+    """
+    Sweeps k from k_min to k_max and keeps the k with the best silhouette.
 
-    results = Parallel(n_jobs=-1)(
-        delayed(_fit_one_k)(k, data, random_state) for k in k_values
-    )
+    mode="exact" (default) fits KMeans and the full O(n^2) silhouette for
+    every k. mode="scalable" is for corpora where that does not fit in
+    memory: the data is shared with workers as a memory-mapped .npy file,
+    the k range is cut into fixed runs of `chain_length` consecutive k that
+    workers fit with MiniBatchKMeans, warm-starting along each run (the
+    same runs and seeds on any machine), and the silhouette is averaged
+    over `n_resamples` cluster-stratified subsamples of `sample_size` rows,
+    with a 95% interval reported in silhouette_low / silhouette_high.
+
+    Returns:
+        The model fitted at the best k (a KMeans in exact mode, a
+        MiniBatchKMeans in scalable mode), the per-k scores and that k.
+    """
+    if mode not in ["exact", "scalable"]:
+        raise Exception("mode must either be exact or scalable")
+    if chain_length < 1:
+        raise Exception("chain_length must be at least 1")
+    k_values = range(k_min, k_max + 1)
+    if mode == "scalable":
+        print(f"Optimizing MiniBatchKMeans for k from {k_min} to {k_max} (sampled silhouette, n={sample_size:,})...")
+        results = _scalable_sweep(data, k_values, random_state, sample_size, n_resamples, batch_size, chain_length)
+    else:
+        print(f"Optimizing KMeans in PARALLEL for k from {k_min} to {k_max} across all cores...")
+        results = Parallel(n_jobs=-1)(
+            delayed(_fit_one_k)(k, data, random_state) for k in k_values
+        )
+    models = {result['k']: result.pop('model') for result in results}
     results_df = pd.DataFrame(results).set_index('k')
     
     if results_df.empty:
@@ -45,11 +197,5 @@ def find_optimal_kmeans_clusters(
     best_k = int(results_df['silhouette_score'].idxmax())
     best_silhouette_score = results_df['silhouette_score'].max()
     print(f"\nOptimization Complete. Best k={best_k} (Silhouette: {best_silhouette_score:.4f})")
-    
-    best_model = KMeans(
-        n_clusters=best_k, 
-        random_state=random_state, 
-        n_init='auto'
-    )
-    best_model.fit(data)
+    best_model = models[best_k]
     return best_model, results_df, best_k
\ No newline at end of file
@@ -0,0 +1,6 @@
+import os, sys
+
+# lib modules import each other flat, the way the notebooks load them
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+# pipelines is imported as a package from relevancy-classifier/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "relevancy-classifier"))
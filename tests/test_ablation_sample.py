@@ -0,0 +1,72 @@
+import math
+import numpy as np
+import pytest
+
+for module in ("datasets", "hdbscan", "umap", "skopt"):
+    pytest.importorskip(module)
+from pipelines.custom_pipeline import ablation_grid
+
+
+def _reference(labels, probabilities, target, seed, filter_mode, inter, intra):
+    # the per-cluster loop generate_ablation_sample used before ablation_grid,
+    # returning {label: (eligible positions, sampled positions)}
+    out = {}
+    rows = np.flatnonzero(labels != -1)
+    clusters = {}
+    for label in np.unique(labels[rows]):
+        members = rows[labels[rows] == label]
+        p = probabilities[members]
+        mean, std = p.mean(), p.std()
+        mask = {
+            "above_mean": p > mean,
+            "below_mean": p <= mean,
+            "above_mean_std": p > mean - std,
+        }.get(filter_mode, np.ones(len(p), dtype=bool))
+        if mask.any():
+            clusters[label] = (members[mask], p[mask])
+    total = sum(len(m) for m, _ in clusters.values())
+    for label, (members, p) in clusters.items():
+        if inter == "equal":
+            budget = math.ceil(target / len(clusters))
+        else:
+            budget = round(len(members) / total * target)
+        budget = max(min(budget, len(members)), 1)
+        weights = {
+            "inverse_prob": 1.0 / (p + 1e-6),
+            "mild_inverse_prob": (1.0 - p) + 1e-5,
+            "confidence_prob": p,
+        }.get(intra)
+        np.random.seed(seed)
+        sample = np.random.choice(members, size=budget, replace=False,
+                                  p=None if weights is None else weights / weights.sum())
+        out[label] = (members, sample)
+    return out
+
+
+def test_grid_matches_per_cluster_sampler():
+    rng = np.random.default_rng(0)
+    labels = rng.choice([-1, 0, 1, 2, 3], size=600, p=[0.1, 0.5, 0.25, 0.1, 0.05])
+    probabilities = rng.uniform(0.05, 1.0, size=600)
+    grid = ablation_grid(labels, probabilities, 150, seed=7)
+    assert len(grid) == 4 * 2 * 4
+    for (filter_mode, inter, intra), indices in grid.items():
+        expected = _reference(labels, probabilities, 150, 7, filter_mode, inter, intra)
+        assert len(np.unique(indices)) == len(indices)
+        assert set(np.unique(labels[indices])) == set(expected)
+        for label, (members, sample) in expected.items():
+            got = indices[labels[indices] == label]
+            assert len(got) == len(sample), (filter_mode, inter, intra, label)
+            assert np.isin(got, members).all()
+            if len(sample) == len(members):
+                assert set(got) == set(sample)
+
+
+def test_confidence_prob_with_zero_probabilities_raises():
+    labels = np.array([0] * 5 + [1] * 70)
+    probabilities = np.concatenate([np.full(5, 0.9), np.zeros(70)])
+    with pytest.raises(Exception, match="non-zero weight"):
+        ablation_grid(labels, probabilities, 50, seed=0, filter_modes=["none"],
+                      inter_cluster_strategies=["direct_proportion"], intra_cluster_biases=["confidence_prob"])
+    grid = ablation_grid(labels, probabilities, 50, seed=0, filter_modes=["none"],
+                         inter_cluster_strategies=["direct_proportion"], intra_cluster_biases=["uniform"])
+    assert len(grid[("none", "direct_proportion", "uniform")]) == 50
@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("jaconv")
+pytest.importorskip("emoji")
+from _cleaner import TwitterCleaner, check_against_reference, clean_twitter_text
+
+# (raw, what the notebook cleantext / clean_twitter_text returns)
+GOLDEN = [
+    # NFKC + z2h: full-width letters, digits and the ideographic space
+    ("RT @budi: Ｈｅｌｌｏ　ＷＯＲＬＤ １２３ https://t.co/abc lihat", "@user: hello world 123 <url> lihat"),
+    # leading rt with extra spaces; a mention inside a URL stays part of the URL
+    ("rt  cek https://x.co/a@b dan @user_1 juga", "cek <url> dan @user juga"),
+    # glued year, repeated punctuation, everything from "kutipan" on is cut
+    ("Banjir 2024Jakarta parah!!! Kutipan dari @akun: isi lama", "banjir 2024 jakarta parah!"),
+    ("beritanya dari detik.com ok", "beritanya ok"),
+    ("negaradari kompas.com", "negara"),
+    ("sumber cnn.com saja", "sumber saja"),
+    ("tanya grok apa iya\\nbaris baru", "apa iya baris baru"),
+    ("mantap 👍 sekaliii", "mantap thumbs_up sekali"),
+    ("rt", "rt"),
+    ("", ""),
+]
+
+
+@pytest.mark.parametrize("raw, expected", GOLDEN)
+def test_reference_golden(raw, expected):
+    assert clean_twitter_text({"content": raw})["content"] == expected
+
+
+@pytest.mark.parametrize("raw, expected", GOLDEN)
+def test_cleaner_golden(raw, expected):
+    assert TwitterCleaner().clean(raw) == expected
+
+
+def test_batch_matches_reference():
+    texts = [raw for raw, _ in GOLDEN] + [
+        "Kutipan di awal semua hilang",
+        "RT RT @a @b https://t.co/1https://t.co/2",
+        "ｒｔ ｈｔｔｐｓ://ｔ.ｃｏ/ｚ",
+        "baca selengkapnya dari KOMPAS.COM sekarang",
+    ]
+    assert check_against_reference(texts) == []
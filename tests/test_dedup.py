@@ -0,0 +1,37 @@
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+datasets = pytest.importorskip("datasets")
+from _dedup import deduplicate
+
+TEXTS = [
+    "banjir di jakarta parah sekali hari ini",
+    "banjir di jakarta parah sekali hari ini ya",
+    "harga beras naik lagi minggu ini https://t.co/x",
+    "harga beras naik lagi minggu ini",
+    "@a @b",
+    "@c",
+    "",
+    "ruu tni disahkan dpr malam ini",
+] * 5
+
+
+def test_dataset_files_match_table(tmp_path):
+    # a shuffled, selected Dataset on disk is read through its indices
+    # mapping by the workers and must agree with the materialized texts
+    datasets.Dataset.from_dict({"content": TEXTS}).save_to_disk(str(tmp_path))
+    ds = datasets.load_from_disk(str(tmp_path)).shuffle(seed=3).select(range(30))
+    expected = deduplicate(pa.table({"content": ds["content"]}), n_jobs=2)
+    assert deduplicate(ds, n_jobs=2).equals(expected)
+    in_memory = datasets.Dataset.from_dict({"content": TEXTS}).shuffle(seed=3).select(range(30))
+    assert deduplicate(in_memory, n_jobs=2).equals(expected)
+
+
+def test_shingle_less_texts_only_match_exactly():
+    result = deduplicate(pa.table({"content": ["@a @b", "@c", "", "https://t.co/x", "@a @b"]}), n_jobs=1)
+    assert result.column("keep").to_pylist() == [True, True, True, True, False]
+
+
+def test_empty_source():
+    result = deduplicate(pa.table({"content": pa.array([], pa.string())}), n_jobs=1)
+    assert result.num_rows == 0
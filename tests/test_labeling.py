@@ -0,0 +1,90 @@
+import asyncio, json, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+pytest.importorskip("ollama")
+BaseModel = pytest.importorskip("pydantic").BaseModel
+from _labeling import LabelingRunner
+
+
+class Label(BaseModel):
+    relevant: bool
+
+
+class _StubOllama(BaseHTTPRequestHandler):
+    # replies per tweet text: "flaky" fails with a 500 once, "fenced" sends
+    # malformed JSON once and then a fenced reply, "broken" never parses
+    calls = {}
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        text = body["messages"][-1]["content"]
+        attempt = self.calls[text] = self.calls.get(text, 0) + 1
+        if text == "flaky" and attempt == 1:
+            self.send_response(500)
+            self.end_headers()
+            self.wfile.write(b'{"error": "model is loading"}')
+            return
+        if text == "broken" or (text == "fenced" and attempt == 1):
+            content = '{"relevant": tru'
+        elif text == "fenced":
+            content = '```json\n{"relevant": false}\n```'
+        else:
+            content = '{"relevant": true}'
+        reply = json.dumps({
+            "model": body["model"], "created_at": "2025-01-01T00:00:00Z", "done": True,
+            "message": {"role": "assistant", "content": content},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def ollama_host():
+    _StubOllama.calls = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def _runner(host, checkpoint, **kwargs):
+    return LabelingRunner("stub", "system", Label, checkpoint=str(checkpoint), host=host,
+                          concurrency=2, backoff=0.0, **kwargs)
+
+
+def test_retries_malformed_json_and_resume(ollama_host, tmp_path):
+    checkpoint = tmp_path / "labels.jsonl"
+    runner = _runner(ollama_host, checkpoint, max_retries=3)
+    labels = runner.run(["ok", "flaky", "fenced", "broken", "ok"])
+    assert labels == [{"relevant": True}, {"relevant": True}, {"relevant": False}, None, {"relevant": True}]
+    assert _StubOllama.calls == {"ok": 1, "flaky": 2, "fenced": 2, "broken": 3}
+    stats = runner.stats()
+    assert (stats["labeled"], stats["failed"], stats["retries"]) == (3, 1, 4)
+    assert len(checkpoint.read_text().splitlines()) == 3
+
+    # a fresh runner on the same checkpoint only retries the failed row
+    resumed = _runner(ollama_host, checkpoint, max_retries=1)
+    assert resumed.run(["ok", "flaky", "fenced", "broken"])[:3] == labels[:3]
+    assert resumed.stats()["resumed"] == 3
+    assert _StubOllama.calls["broken"] == 4 and _StubOllama.calls["ok"] == 1
+
+
+def test_run_inside_a_running_event_loop(ollama_host, tmp_path):
+    runner = _runner(ollama_host, tmp_path / "labels.jsonl")
+
+    async def notebook_cell():
+        return runner.run(["ok"])
+
+    assert asyncio.run(notebook_cell()) == [{"relevant": True}]
+
+
+def test_max_retries_must_be_positive(tmp_path):
+    with pytest.raises(Exception, match="max_retries"):
+        _runner(None, tmp_path / "labels.jsonl", max_retries=0)
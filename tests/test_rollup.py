@@ -0,0 +1,40 @@
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+from _rollup import SentimentRollup
+
+
+def _posts(sentiments, ids=None):
+    ids = ids or [str(i) for i in range(len(sentiments))]
+    return pa.table({
+        "tweet_id": ids,
+        "time": ["2024-08-01T10:00:00"] * len(sentiments),
+        "sentiment": sentiments,
+        "relevant": [True] * len(sentiments),
+    })
+
+
+def _total(rollup):
+    return int(rollup.daily().drop(columns="relevant").to_numpy().sum())
+
+
+def test_bad_sentiment_then_retry(tmp_path):
+    rollup = SentimentRollup(str(tmp_path))
+    # the first batch is fine, the second carries an out-of-range class
+    with pytest.raises(Exception, match="sentiment must be in"):
+        rollup.update(_posts([0, 1, 2, 7]), batch_rows=2)
+    assert rollup.update(_posts([0, 1, 2, 2]), batch_rows=2) == 4
+    assert _total(rollup) == 4
+    # a fresh instance reads back the same state from disk
+    reloaded = SentimentRollup(str(tmp_path))
+    assert _total(reloaded) == 4
+    assert reloaded.update(_posts([0, 1, 2, 2])) == 0
+
+
+def test_missing_id_column(tmp_path):
+    posts = _posts([0, 2]).drop_columns(["tweet_id"])
+    with pytest.raises(Exception, match="id_column=None"):
+        SentimentRollup(str(tmp_path / "a")).update(posts)
+    rollup = SentimentRollup(str(tmp_path / "b"), id_column=None)
+    assert rollup.update(posts) == 2
+    assert rollup.update(posts) == 2
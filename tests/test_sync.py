@@ -0,0 +1,80 @@
+import json, os
+from datetime import datetime, timedelta
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+pytest.importorskip("bson")
+import pyarrow.parquet as pq
+import _sync
+from _sync import sync_posts
+
+
+def _posts(collection, start, count):
+    # the scraper fills `time` in backwards while scrolling, so later
+    # inserts carry older times
+    collection.insert_many([
+        {"tweet_id": str(i), "time": datetime(2024, 6, 1) - timedelta(hours=i),
+         "content": f"post {i}", "like_count": float(i), "__v": 0}
+        for i in range(start, start + count)
+    ])
+
+
+def _ids(path):
+    return pq.read_table(path).column("tweet_id").to_pylist()
+
+
+def test_high_water_mark(tmp_path):
+    collection = mongomock.MongoClient().db.posts
+    out = str(tmp_path / "delta")
+    _posts(collection, 0, 5)
+    first = sync_posts(collection, out, batch_size=2)
+    assert _ids(first) == [str(i) for i in range(5)]
+    assert pq.read_table(first).column("like_count").to_pylist() == list(range(5))
+
+    assert sync_posts(collection, out) is None
+    _posts(collection, 5, 3)
+    second = sync_posts(collection, out, batch_size=2)
+    assert second != first
+    assert _ids(second) == ["5", "6", "7"]
+
+    with open(os.path.join(out, "sync_state.json")) as f:
+        state = json.load(f)
+    assert state["rows"] == 8
+    assert state["last_id"] == str(collection.find_one({"tweet_id": "7"})["_id"])
+    # the largest time came with the first batch, not the last insert
+    assert state["max_time"] == "2024-06-01T00:00:00.000"
+    assert state["shards"] == [os.path.basename(first), os.path.basename(second)]
+
+
+def test_resume_after_interrupted_sync(tmp_path, monkeypatch):
+    collection = mongomock.MongoClient().db.posts
+    out = str(tmp_path / "delta")
+    _posts(collection, 0, 3)
+    first = sync_posts(collection, out)
+    _posts(collection, 3, 5)
+
+    normalize = _sync.normalize_mongo_record
+
+    def crash_at_post_6(record):
+        if record["tweet_id"] == "6":
+            raise KeyboardInterrupt
+        return normalize(record)
+
+    monkeypatch.setattr(_sync, "normalize_mongo_record", crash_at_post_6)
+    with pytest.raises(KeyboardInterrupt):
+        sync_posts(collection, out, batch_size=2)
+    with open(os.path.join(out, "sync_state.json")) as f:
+        state = json.load(f)
+    # a row group was flushed before the crash, but only to the temporary
+    assert state["rows"] == 3 and state["shards"] == [os.path.basename(first)]
+    assert [name for name in os.listdir(out) if name.endswith(".parquet")] == [os.path.basename(first)]
+    assert any(name.endswith(".parquet.tmp") for name in os.listdir(out))
+
+    monkeypatch.setattr(_sync, "normalize_mongo_record", normalize)
+    second = sync_posts(collection, out, batch_size=2)
+    assert _ids(second) == ["3", "4", "5", "6", "7"]
+    assert sorted(name for name in os.listdir(out) if name.endswith(".parquet")) == sorted(
+        [os.path.basename(first), os.path.basename(second)]
+    )
+    with open(os.path.join(out, "sync_state.json")) as f:
+        assert json.load(f)["rows"] == 8